@@ -17,16 +17,22 @@
 # 14 Sep 2016, Len Shustek: Added Logout()
 # 17 Jul 2017, Andreas Jakl: Port to Python 3 (https://www.andreasjakl.com/using-netgear-arlo-security-cameras-for-periodic-recording/)
 
+import collections
 import datetime
-#import logging
+import errno
+import itertools
+import logging
 import json
-import math
+import re
 import monotonic
 import os
 import random
 import requests
+import select
 import signal
+import socket
 import sseclient
+import ssl
 import threading
 import time 
 import sys
@@ -34,16 +40,559 @@ if sys.version[0] == '2':
     import Queue as queue
 else:
     import queue as queue
+try:
+    import selectors
+except ImportError:
+    selectors = None
+if sys.version[0] == '2':
+    from __builtin__ import intern
+    from collections import Mapping
+    from urlparse import urlparse
+else:
+    from sys import intern
+    from collections.abc import Mapping
+    from urllib.parse import urlparse
+
+# Use a faster json decoder for the EventStream if one is installed, otherwise fall back to the stdlib.
+try:
+    import orjson as fastjson
+except ImportError:
+    try:
+        import ujson as fastjson
+    except ImportError:
+        fastjson = json
 
 #logging.basicConfig(level=logging.DEBUG,format='[%(levelname)s] (%(threadName)-10s) %(message)s',)
+# Errors on background threads (EventHub, ArloPool) are reported here, since there's no caller to raise them to.
+log = logging.getLogger('Arlo')
+
+##
+# A single message received from the EventStream.
+#
+# Decoding the whole payload of every message is expensive, since a lot of them carry large "properties" blobs and
+# most of them just get re-queued or dropped. So get() looks up the fields needed to route the message (transId, from,
+# resource, action and status) in the raw text instead, and the full body is only decoded the first time it's accessed.
+#
+# A routing field only counts if it's a key of the top-level object. Escaped characters are blanked out first (without
+# moving anything), so every quote that's left starts or ends a string; the text outside of the strings on one side of
+# the key then tells us how deeply it's nested, which means keys inside of "properties" (or inside of string values) are
+# never mistaken for top-level ones. Only the shorter side is looked at, and routing fields tend to be near the start or
+# the end of a message. Fields that aren't strings are left to the decoder.
+#
+# It behaves like a read-only dict, so event.get('properties') works as expected. Use event.body to get the decoded dict.
+##
+class StreamEvent(Mapping):
+    ROUTING_FIELDS = ('transId', 'from', 'resource', 'action', 'status')
+    # What follows a key: the colon, and the opening quote if the value is a string.
+    KEY_RE = re.compile(r'\s*:\s*(")?')
+    # Stand-ins for routing fields that aren't top-level keys, and ones whose value isn't a string.
+    MISSING = object()
+    NOT_A_STRING = object()
+
+    __slots__ = ('raw', 'routing', '_body')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._body = None
+        self.routing = {}
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = fastjson.loads(self.raw)
+        return self._body
+
+    def get(self, key, default=None):
+        if self._body is None and key in self.ROUTING_FIELDS:
+            value = self.routing.get(key)
+            if value is None:
+                value = self.routing[key] = self.FindRoutingField(key)
+            if value is self.MISSING:
+                return default
+            if value is not self.NOT_A_STRING:
+                return value
+        return self.body.get(key, default)
+
+    # Returns the value of the top-level key in self.raw if it's a string, MISSING or NOT_A_STRING otherwise.
+    def FindRoutingField(self, key):
+        raw = self.raw
+        if '\\' in raw:
+            raw = raw.replace('\\\\', '  ').replace('\\"', '  ')
+        token = '"'+key+'"'
+        found = self.MISSING
+        at = raw.find(token)
+        while at >= 0:
+            end = at + len(token)
+            if at < len(raw) - end:
+                pieces = raw[:at].split('"')
+                outside = ''.join(pieces[::2])
+                depth = outside.count('{') + outside.count('[') - outside.count('}') - outside.count(']')
+            else:
+                pieces = raw[end:].split('"')
+                outside = ''.join(pieces[::2])
+                depth = outside.count('}') + outside.count(']') - outside.count('{') - outside.count('[')
+            # An odd number of quotes on either side means the token is inside of a string.
+            match = self.KEY_RE.match(raw, end) if depth == 1 and len(pieces) % 2 == 1 else None
+            if match is not None:
+                if match.group(1):
+                    value = self.raw[match.end():raw.find('"', match.end())]
+                    found = json.loads('"'+value+'"') if '\\' in value else value
+                else:
+                    found = self.NOT_A_STRING
+            at = raw.find(token, end)
+        return found
+
+    def __getitem__(self, key):
+        return self.body[key]
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def __len__(self):
+        return len(self.body)
+
+    def __repr__(self):
+        return 'StreamEvent('+self.raw+')'
+
+##
+# A single EventStream connection that is read without blocking, so that an EventHub can service lots of them from one thread.
+#
+# The request and response headers are handled synchronously in Open(), after that the socket is switched to non-blocking
+# mode and Read() returns the data of any complete server-sent events that have arrived.
+##
+class EventConnection(object):
+    def __init__(self, url, headers, on_event, on_close):
+        self.url = url
+        self.headers = headers
+        self.on_event = on_event
+        self.on_close = on_close
+        # Set by EventHub.Open().
+        self.hub = None
+        self.loop = None
+        self.sock = None
+        self.fd = None
+        self.closed = False
+        # Why the hub closed the connection, if it wasn't the server hanging up.
+        self.error = None
+        self.chunked = False
+        self.raw = b''
+        self.text = b''
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def Open(self, timeout=30):
+        url = urlparse(self.url)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        sock = socket.create_connection((url.hostname, port), timeout)
+        if url.scheme == 'https':
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=url.hostname)
+
+        request = 'GET '+(url.path or '/')+('?'+url.query if url.query else '')+' HTTP/1.1\r\nHost: '+url.netloc+'\r\nAccept: text/event-stream\r\nCache-Control: no-cache\r\n'
+        for name, value in self.headers.items():
+            request += name+': '+value+'\r\n'
+        sock.sendall((request+'\r\n').encode('utf-8'))
+
+        response = b''
+        while b'\r\n\r\n' not in response:
+            data = sock.recv(4096)
+            if not data:
+                sock.close()
+                raise Exception('Subscribe failed', response)
+            response += data
+        head, self.raw = response.split(b'\r\n\r\n', 1)
+        lines = head.decode('latin-1').split('\r\n')
+        if lines[0].split(' ')[1] != '200':
+            sock.close()
+            raise Exception('Subscribe failed', lines[0])
+        self.chunked = any(line.lower().replace(' ', '') == 'transfer-encoding:chunked' for line in lines[1:])
+
+        sock.setblocking(False)
+        self.sock = sock
+        self.fd = sock.fileno()
+        return self
+
+    def Pending(self):
+        # SSL sockets can hold decrypted data that select() doesn't know about.
+        return hasattr(self.sock, 'pending') and self.sock.pending() > 0
+
+    def Read(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except ssl.SSLWantReadError:
+                break
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if not data:
+                self.closed = True
+                break
+            self.raw += data
+
+        if self.chunked:
+            self.DecodeChunks()
+        else:
+            self.text += self.raw
+            self.raw = b''
+
+        self.text = self.text.replace(b'\r\n', b'\n')
+        events = []
+        while b'\n\n' in self.text:
+            block, self.text = self.text.split(b'\n\n', 1)
+            data = [ line[5:].lstrip(b' ') for line in block.split(b'\n') if line.startswith(b'data:') ]
+            if data:
+                events.append(b'\n'.join(data).decode('utf-8'))
+        return events
+
+    def DecodeChunks(self):
+        while True:
+            end = self.raw.find(b'\r\n')
+            if end < 0:
+                return
+            size = int(self.raw[:end].split(b';')[0], 16)
+            if size == 0:
+                self.closed = True
+                return
+            if len(self.raw) < end + 2 + size + 2:
+                return
+            self.text += self.raw[end+2:end+2+size]
+            self.raw = self.raw[end+2+size+2:]
+
+    # Only called from the hub's thread (or before the hub has the connection), use Stop() everywhere else.
+    def Close(self):
+        self.closed = True
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+
+    # Stops reading the stream and closes the socket. on_close isn't called, since the caller already knows.
+    def Stop(self):
+        if self.hub is not None:
+            self.hub.Remove(self)
+        else:
+            self.Close()
+
+##
+# Waits for EventConnections to become readable with the best mechanism available: selectors (epoll, kqueue, etc.) on
+# Python 3, poll() on Python 2, and select() only if neither of those exist, since select() can't handle file
+# descriptors of FD_SETSIZE (usually 1024) or higher.
+##
+class EventPoller(object):
+    def __init__(self):
+        self.connections = {}
+        self.selector = None
+        self.poller = None
+        if selectors is not None:
+            self.selector = selectors.DefaultSelector()
+        elif hasattr(select, 'poll'):
+            self.poller = select.poll()
+
+    def Register(self, connection):
+        if self.selector is not None:
+            self.selector.register(connection.fd, selectors.EVENT_READ)
+        elif self.poller is not None:
+            self.poller.register(connection.fd, select.POLLIN)
+        self.connections[connection.fd] = connection
+
+    def Unregister(self, connection):
+        if self.connections.pop(connection.fd, None) is None:
+            return
+        try:
+            if self.selector is not None:
+                self.selector.unregister(connection.fd)
+            elif self.poller is not None:
+                self.poller.unregister(connection.fd)
+        except (KeyError, ValueError, select.error):
+            pass
+
+    def Wait(self, timeout):
+        if self.selector is not None:
+            fds = [ key.fd for key, events in self.selector.select(timeout) ]
+        elif self.poller is not None:
+            fds = [ fd for fd, events in self.poller.poll(timeout * 1000) ]
+        else:
+            fds = select.select(list(self.connections), [], [], timeout)[0]
+        return [ self.connections[fd] for fd in fds if fd in self.connections ]
+
+##
+# Reads the EventStreams of any number of Arlo clients on a fixed number of threads.
+#
+# Without a hub, every call to Subscribe() starts a thread that blocks reading its EventStream. When an Arlo object is
+# given an EventHub (see ArloPool), its EventStreams are opened with Open() instead and multiplexed with select(), so the
+# thread count doesn't grow with the number of accounts or basestations.
+#
+# The on_event and on_close callbacks are called from the hub's threads, so they should be quick. Exceptions raised by
+# them are logged to the 'Arlo' logger and don't close the stream. When the hub closes a stream because reading it failed,
+# the exception is kept in the connection's error.
+##
+class EventHub(object):
+    def __init__(self, threads=1):
+        self.lock = threading.Lock()
+        self.stopped = False
+        self.loops = []
+        for i in range(max(1, threads)):
+            loop = {'connections':[], 'added':[], 'removed':[]}
+            loop['thread'] = threading.Thread(name="EventHub", target=self.Run, args=(loop,))
+            loop['thread'].setDaemon(True)
+            loop['thread'].start()
+            self.loops.append(loop)
+
+    def Open(self, url, headers, on_event, on_close=None):
+        connection = EventConnection(url, headers, on_event, on_close).Open()
+        with self.lock:
+            loop = min(self.loops, key=lambda loop: len(loop['connections']) + len(loop['added']))
+            connection.hub = self
+            connection.loop = loop
+            loop['added'].append(connection)
+        return connection
+
+    ##
+    # Stops reading the connection. It's unregistered and closed by the thread that reads it, since closing a socket that's
+    # still registered with a poller can break the poller once the file descriptor gets reused.
+    ##
+    def Remove(self, connection):
+        with self.lock:
+            loop = connection.loop
+            if connection in loop['added']:
+                loop['added'].remove(connection)
+                connection.Close()
+            elif not connection.closed and connection not in loop['removed']:
+                loop['removed'].append(connection)
+
+    def Count(self):
+        with self.lock:
+            return sum(len(loop['connections']) + len(loop['added']) for loop in self.loops)
+
+    def Stop(self):
+        self.stopped = True
+
+    def Run(self, loop):
+        connections = loop['connections']
+        poller = EventPoller()
+        while not self.stopped:
+            with self.lock:
+                added = loop['added'][:]
+                del loop['added'][:]
+                connections.extend(added)
+                removed = loop['removed'][:]
+                del loop['removed'][:]
+            for connection in added:
+                try:
+                    poller.Register(connection)
+                except Exception as e:
+                    log.warning('EventHub: registering an event stream failed', exc_info=True)
+                    connection.error = e
+                    self.Close(loop, poller, connection)
+            for connection in removed:
+                if connection in connections:
+                    self.Close(loop, poller, connection, notify=False)
+
+            if not connections:
+                time.sleep(0.5)
+                continue
+
+            readable = [ connection for connection in connections if connection.Pending() ]
+            if not readable:
+                try:
+                    readable = poller.Wait(0.5)
+                except Exception as e:
+                    if getattr(e, 'errno', None) == errno.EINTR or (e.args and e.args[0] == errno.EINTR):
+                        continue
+                    # Don't spin on a poller that keeps failing: drop this loop's connections (their EventStreams get
+                    # disconnected, so the next Subscribe() reconnects them) and back off.
+                    log.error('EventHub: waiting for events failed, closing %d event streams', len(connections), exc_info=True)
+                    for connection in connections[:]:
+                        connection.error = e
+                        self.Close(loop, poller, connection)
+                    time.sleep(1)
+                    continue
+
+            for connection in readable:
+                try:
+                    events = connection.Read()
+                except Exception as e:
+                    log.warning('EventHub: reading an event stream failed', exc_info=True)
+                    events = []
+                    connection.error = e
+                    connection.closed = True
+
+                for data in events:
+                    # A bad message (or a bug in the callback) shouldn't take the whole stream down.
+                    try:
+                        connection.on_event(data)
+                    except Exception:
+                        log.exception('EventHub: event callback failed for %s', data[:200])
+
+                if connection.closed:
+                    self.Close(loop, poller, connection)
+
+        for connection in connections[:]:
+            self.Close(loop, poller, connection)
+
+    def Close(self, loop, poller, connection, notify=True):
+        poller.Unregister(connection)
+        connection.Close()
+        if connection in loop['connections']:
+            loop['connections'].remove(connection)
+        if notify and connection.on_close:
+            try:
+                connection.on_close()
+            except Exception:
+                log.exception('EventHub: close callback failed')
+
+##
+# Strings like deviceId, timeZone and ownerId repeat across every recording in the library, so we keep one copy of each.
+#
+# Python 2's intern() only takes byte strings, and json gives us unicode ones, so those are kept in a dict instead.
+# Only the low-cardinality fields listed in Record.INTERNED go through here, so it stays small.
+##
+if sys.version[0] == '2':
+    interned_unicode = {}
+
+    def intern_string(value):
+        if isinstance(value, str):
+            return intern(value)
+        if isinstance(value, type(u'')):
+            return interned_unicode.setdefault(value, value)
+        return value
+else:
+    def intern_string(value):
+        if isinstance(value, str):
+            return intern(value)
+        return value
+
+##
+# Compact, read-only stand-ins for the dicts returned by GetLibrary() and GetDevices().
+#
+# Known keys live in __slots__ instead of a per-record dict, and the keys listed in INTERNED share a single string
+# instance across records. Any keys we don't know about are kept in extra, so ToDict() gives you back what Arlo sent.
+#
+# Records work like read-only dicts (get(), [], in, keys(), items(), dict(record), etc.), so they can be passed to methods
+# like TakeSnapshot(), DeleteRecording() and BatchDeleteRecordings() as-is. They don't inherit from Mapping, since on
+# Python 2 that would give every record a __dict__ again; they're registered with it instead, so isinstance() works.
+# json.dumps() only accepts real dicts, so use record.ToDict() (or json.dumps(records, default=dict)) to serialize them.
+##
+class Record(object):
+    FIELDS = ()
+    INTERNED = ()
+
+    __slots__ = ('extra',)
+
+    def __init__(self, data):
+        self.extra = None
+        for key, value in data.items():
+            if key in self.FIELDS:
+                if key in self.INTERNED and value is not None:
+                    value = intern_string(value)
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    @classmethod
+    def FromList(cls, items):
+        return [cls(item) for item in items]
+
+    def ToDict(self):
+        data = {}
+        for key in self.FIELDS:
+            try:
+                data[key] = getattr(self, key)
+            except AttributeError:
+                pass
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def get(self, key, default=None):
+        if key in self.FIELDS:
+            return getattr(self, key, default)
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def __iter__(self):
+        for key in self.FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self.extra:
+            for key in self.extra:
+                yield key
+
+    def __len__(self):
+        return sum(1 for key in self.FIELDS if hasattr(self, key)) + len(self.extra or ())
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [ self[key] for key in self ]
+
+    def items(self):
+        return [ (key, self[key]) for key in self ]
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.ToDict() == dict(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return self.__class__.__name__+'('+repr(self.ToDict())+')'
+
+Mapping.register(Record)
+
+class Recording(Record):
+    FIELDS = ('name', 'uniqueId', 'deviceId', 'ownerId', 'createdBy', 'createdDate', 'utcCreatedDate', 'localCreatedDate',
+              'lastModified', 'timeZone', 'contentType', 'reason', 'currentState', 'mediaDuration', 'mediaDurationSecond',
+              'presignedContentUrl', 'presignedThumbnailUrl')
+    INTERNED = ('uniqueId', 'deviceId', 'ownerId', 'createdBy', 'createdDate', 'timeZone', 'contentType', 'reason',
+                'currentState', 'mediaDuration')
+
+    __slots__ = FIELDS
+
+    ##
+    # Returns just the keys the /library/recycle endpoint needs, for use with BatchDeleteRecordings().
+    ##
+    def ToDeleteDict(self):
+        return {'createdDate':self.get('createdDate'), 'utcCreatedDate':self.get('utcCreatedDate'), 'deviceId':self.get('deviceId')}
+
+class Device(Record):
+    FIELDS = ('deviceId', 'deviceName', 'deviceType', 'parentId', 'xCloudId', 'uniqueId', 'userId', 'userRole', 'modelId',
+              'state', 'displayOrder', 'mediaObjectCount', 'lastModified', 'dateCreated', 'interfaceVersion', 'properties')
+    INTERNED = ('deviceType', 'parentId', 'xCloudId', 'userId', 'userRole', 'modelId', 'state')
+
+    __slots__ = FIELDS
 
 class EventStream(object):
     def __init__(self, method, args):
         self.connected = False
         self.registered = False
         self.queue = queue.Queue()
-        self.thread = threading.Thread(name="EventStream", target=method, args=(args))
-        self.thread.setDaemon(True)
+        # Streams read by an EventHub don't get a thread of their own, just an EventConnection.
+        self.thread = None
+        self.connection = None
+        if method is not None:
+            self.thread = threading.Thread(name="EventStream", target=method, args=(args))
+            self.thread.setDaemon(True)
 
     def Get(self, block=True, timeout=None):
         if sys.version[0] == '2' and block:
@@ -70,7 +619,8 @@ class EventStream(object):
             return item
 
     def Start(self):
-        self.thread.start()
+        if self.thread is not None:
+            self.thread.start()
 
     def Connect(self):
         self.connected = True
@@ -78,6 +628,9 @@ class EventStream(object):
     def Disconnect(self):
         self.connected = False
         self.Unregister()
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            connection.Stop()
         if self.queue:
             self.queue.put(None)
 
@@ -87,13 +640,294 @@ class EventStream(object):
     def Unregister(self):
         self.registered = False
 
+##
+# A callback added with Arlo.AddEventHandler().
+#
+# Events are checked against resources on the thread that reads the EventStream (which only looks at the routing fields),
+# and the ones that match are passed to the callback in the order they arrived. If the client has an executor (see
+# ArloPool), the callback runs there, one event per job, so a busy basestation can't hold on to a worker. Otherwise it's
+# called on the thread that reads the EventStream.
+##
+class EventHandler(object):
+    def __init__(self, arlo, basestation, callback, resources=None):
+        self.arlo = arlo
+        self.basestation = basestation
+        self.callback = callback
+        self.resources = tuple(resources) if resources is not None else None
+        self.lock = threading.Lock()
+        self.pending = collections.deque()
+        self.running = False
+
+    # Same rules as HandleEvents(): responses to our own Notify() calls always match.
+    def Matches(self, event):
+        if self.resources is None:
+            return True
+        return (event.get('resource') or '').startswith(self.resources) or (event.get('transId') or '').startswith(Arlo.TRANSID_PREFIX+'!')
+
+    def Push(self, event):
+        if not self.Matches(event):
+            return
+        with self.lock:
+            self.pending.append(event)
+            if self.running:
+                return
+            self.running = True
+        if self.arlo.executor is None:
+            while self.HandleNext():
+                pass
+        else:
+            self.arlo.executor.Submit(getattr(self.arlo, 'username', None), self.Run)
+
+    # Handles the oldest pending event. Returns False once there are none left.
+    def HandleNext(self):
+        with self.lock:
+            if not self.pending:
+                self.running = False
+                return False
+            event = self.pending.popleft()
+        try:
+            self.callback(self.arlo, self.basestation, event.body)
+        except Exception:
+            log.exception('EventHandler: callback failed')
+        return True
+
+    def Run(self):
+        if self.HandleNext():
+            # Go to the back of the line for the next one.
+            self.arlo.executor.Submit(getattr(self.arlo, 'username', None), self.Run)
+
+##
+# A live stream handed out by StreamManager.Acquire(). stream is what StartStream() returned (the rtmps url).
+##
+class StreamSession(object):
+    def __init__(self, camera, stream, expires, now):
+        self.camera = camera
+        self.camera_id = camera.get('deviceId')
+        self.stream = stream
+        self.expires = expires
+        self.last_used = now
+        self.refs = 1
+        # False once the session has expired or been invalidated, so it won't be handed out again.
+        self.current = True
+
+##
+# Keeps track of the live streams started with StartStream(), so that TakeSnapshot() and StartRecording() can reuse a
+# camera's stream instead of starting a new one (and waking the camera up) every time.
+#
+# Each stream is reference counted: Acquire() returns a StreamSession for the camera (starting a new stream if there isn't
+# an unexpired one) and Release() gives that session back. Streams are never handed out more than ttl seconds after they
+# were started. Reap() stops the streams that have had no consumers for idle_timeout seconds (and the expired ones nobody
+# is using); unless reaper=False, a background thread calls it while there are streams to look after. A session that
+# expires while it's still in use is stopped as soon as its last consumer releases it, unless the camera has a newer stream.
+#
+# Stats() returns the hit rate and stream start latency.
+##
+class StreamManager(object):
+    def __init__(self, arlo, ttl=300, idle_timeout=30, reaper=True):
+        self.arlo = arlo
+        self.ttl = ttl
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.camera_locks = {}
+        # Current session of each camera, by camera id.
+        self.sessions = {}
+        # Sessions that are no longer current but still have consumers.
+        self.retired = []
+        self.reaper_enabled = reaper
+        self.reaper = None
+        self.hits = 0
+        self.misses = 0
+        self.start_latency_total = 0.0
+        self.start_latency_max = 0.0
+        self.start_latency_last = None
+
+    def Acquire(self, camera):
+        camera_id = camera.get('deviceId')
+        with self.lock:
+            camera_lock = self.camera_locks.setdefault(camera_id, threading.Lock())
+
+        # Only one thread starts a given camera's stream, the others wait for it and reuse it.
+        with camera_lock:
+            with self.lock:
+                session = self.sessions.get(camera_id)
+                if session is not None and monotonic.monotonic() < session.expires:
+                    self.hits += 1
+                    session.refs += 1
+                    session.last_used = monotonic.monotonic()
+                    return session
+                if session is not None:
+                    self.Retire(session)
+
+            started = monotonic.monotonic()
+            stream = self.arlo.StartStream(camera)
+            now = monotonic.monotonic()
+
+            with self.lock:
+                self.misses += 1
+                self.start_latency_last = now - started
+                self.start_latency_total += self.start_latency_last
+                self.start_latency_max = max(self.start_latency_max, self.start_latency_last)
+                session = StreamSession(camera, stream, started + self.ttl, now)
+                self.sessions[camera_id] = session
+                if self.reaper_enabled and self.reaper is None:
+                    self.reaper = threading.Thread(name="StreamManager", target=self.RunReaper)
+                    self.reaper.setDaemon(True)
+                    self.reaper.start()
+            return session
+
+    def Release(self, session):
+        stop = False
+        with self.lock:
+            if session.refs > 0:
+                session.refs -= 1
+                session.last_used = monotonic.monotonic()
+            if session.refs == 0 and session in self.retired:
+                self.retired.remove(session)
+                stop = not self.InUse(session.camera_id)
+        if stop:
+            self.Stop(session)
+
+    # Stop handing out the session (e.g. because the stream stopped working), so the next Acquire() starts a new one.
+    def Invalidate(self, session):
+        stop = False
+        with self.lock:
+            if session.current:
+                self.Retire(session)
+                stop = session.refs == 0 and not self.InUse(session.camera_id)
+        if stop:
+            self.Stop(session)
+
+    # Stops the idle and expired streams. Returns True if there are still streams to look after.
+    def Reap(self):
+        now = monotonic.monotonic()
+        stopped = []
+        with self.lock:
+            for session in list(self.sessions.values()):
+                idle = session.refs == 0 and now - session.last_used > self.idle_timeout
+                if idle or now >= session.expires:
+                    self.Retire(session)
+                    if session.refs == 0 and not self.InUse(session.camera_id):
+                        stopped.append(session)
+            active = bool(self.sessions or self.retired)
+        for session in stopped:
+            self.Stop(session)
+        return active
+
+    def RunReaper(self):
+        while True:
+            time.sleep(max(1, self.idle_timeout / 2.0))
+            self.Reap()
+            with self.lock:
+                if not self.sessions and not self.retired:
+                    self.reaper = None
+                    return
+
+    # The following must be called with self.lock held.
+    def Retire(self, session):
+        if self.sessions.get(session.camera_id) is session:
+            del self.sessions[session.camera_id]
+        session.current = False
+        if session.refs > 0:
+            self.retired.append(session)
+
+    def InUse(self, camera_id):
+        return camera_id in self.sessions or any(session.camera_id == camera_id for session in self.retired)
+
+    ##
+    # Runs under the camera's lock, like starting a stream in Acquire(), so a new stream can't be started (and handed out)
+    # until the camera has been told to stop the old one. If one was started before we got the lock, the camera is in use
+    # again and stopping it would kill the new stream, so it's left alone.
+    ##
+    def Stop(self, session):
+        with self.lock:
+            camera_lock = self.camera_locks.setdefault(session.camera_id, threading.Lock())
+        with camera_lock:
+            with self.lock:
+                if self.InUse(session.camera_id):
+                    return
+            try:
+                self.arlo.StopStream(session.camera)
+            except Exception:
+                pass
+
+    # Stops every stream, including ones that are still in use. Call this before exiting, since the reaper is a daemon thread.
+    def StopAll(self):
+        with self.lock:
+            sessions = list(self.sessions.values()) + self.retired
+            for session in sessions:
+                session.current = False
+            self.sessions = {}
+            self.retired = []
+        stopped = set()
+        for session in sessions:
+            if session.camera_id not in stopped:
+                stopped.add(session.camera_id)
+                self.Stop(session)
+
+    def Stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'active':len(self.sessions) + len(self.retired),
+                'hits':self.hits,
+                'misses':self.misses,
+                'hitRate':float(self.hits) / total if total else 0.0,
+                'startLatencyLast':self.start_latency_last,
+                'startLatencyAvg':self.start_latency_total / self.misses if self.misses else None,
+                'startLatencyMax':self.start_latency_max
+            }
+
+##
+# Splits the inclusive date range (YYYYMMDD strings) into consecutive (from_date, to_date) shards of days_per_shard days each.
+##
+def date_shards(from_date, to_date, days_per_shard=1):
+    start = datetime.datetime.strptime(from_date, '%Y%m%d').date()
+    end = datetime.datetime.strptime(to_date, '%Y%m%d').date()
+    step = datetime.timedelta(days=max(1, days_per_shard))
+    shards = []
+    while start <= end:
+        shard_end = min(start + step - datetime.timedelta(days=1), end)
+        shards.append((start.strftime('%Y%m%d'), shard_end.strftime('%Y%m%d')))
+        start = shard_end + datetime.timedelta(days=1)
+    return shards
+
 class Arlo(object):
     TRANSID_PREFIX = 'web'
-    def __init__(self, username, password):
-        signal.signal(signal.SIGINT, self.interrupt_handler)
+    # Shared by every Arlo object in the process, see genTransId().
+    TRANSID_SEED = '%08x.' % random.getrandbits(32)
+    TRANSID_COUNTER = itertools.count(1)
+    TRANSID_LOCK = threading.Lock()
+    # Max number of pooled connections kept open to each host.
+    POOL_SIZE = 16
+    ##
+    # adapter, event_hub and executor let several Arlo objects share one connection pool, one set of EventStream threads and
+    # one set of worker threads (see ArloPool). When an executor is given, whoever owns it is also responsible for calling
+    # self.streams.Reap() now and then, instead of each client starting its own reaper thread.
+    ##
+    def __init__(self, username, password, adapter=None, event_hub=None, executor=None):
+        # Signal handlers can only be installed from the main thread, which isn't where ArloPool creates its clients.
+        try:
+            signal.signal(signal.SIGINT, self.interrupt_handler)
+        except ValueError:
+            pass
         self.cookies = {}
         self.headers = {}
         self.event_streams = {}
+        # EventHandlers by basestation id. The lists are replaced (under event_handlers_lock) rather than changed, since the
+        # EventStream threads read them without locking.
+        self.event_handlers = {}
+        self.event_handlers_lock = threading.Lock()
+        self.notify_templates = {}
+        self.event_hub = event_hub
+        self.executor = executor
+        self.streams = StreamManager(self, reaper=executor is None)
+        # Stream sessions held by StartRecording() until StopRecording(), by camera id.
+        self.recording_streams = {}
+        self.session = requests.Session()
+        if adapter is None:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=self.POOL_SIZE, pool_maxsize=self.POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.Login(username, password)
 
     def interrupt_handler(self, signum, frame):
@@ -103,46 +937,23 @@ class Arlo(object):
         os._exit(1)
 
 
+    ##
+    # Transaction ids look like web!<random hex>.<counter hex>!<timestamp in ms>.
+    #
+    # The random part is picked once per process and the counter makes every id unique within the process. The counter is
+    # read under a lock, so ids are unique across threads without relying on the GIL.
+    ##
     def genTransId(self, trans_type=TRANSID_PREFIX):
-        def float2hex(f):
-            MAXHEXADECIMALS = 15
-            w = f // 1
-            d = f % 1
-
-            # Do the whole:
-            if w == 0: result = '0'
-            else: result = ''
-            while w:
-                w, r = divmod(w, 16)
-                r = int(r)
-                if r > 9: r = chr(r+55)
-                else: r = str(r)
-                result =  r + result
-
-            # And now the part:
-            if d == 0: return result
-
-            result += '.'
-            count = 0
-            while d:
-                d = d * 16
-                w, d = divmod(d, 1)
-                w = int(w)
-                if w > 9: w = chr(w+55)
-                else: w = str(w)
-                result +=  w
-                count += 1
-                if count > MAXHEXADECIMALS: break
-
-            return result
-
-        now = datetime.datetime.today()
-        return trans_type+"!" + float2hex(random.random() * math.pow(2, 32)).lower() + "!" + str(int((time.mktime(now.timetuple())*1e3 + now.microsecond/1e3)))
-
-    def get(self, url, caller, headers={}, cookies={}, stream=False):
-        cookies.update(self.cookies)
-        headers.update(self.headers)
-        r = requests.get(url, headers=headers, cookies=cookies, stream=stream)
+        with self.TRANSID_LOCK:
+            count = next(self.TRANSID_COUNTER)
+        return trans_type+"!"+self.TRANSID_SEED+"%x" % count+"!"+str(int(time.time()*1e3))
+
+    ##
+    # headers and cookies are added to (and override) the client's own for this request only. Neither they nor the client's
+    # dicts are modified, since default arguments and Notify()'s cached headers are shared between calls (and clients).
+    ##
+    def get(self, url, caller, headers=None, cookies=None, stream=False):
+        r = self.session.get(url, headers=self.RequestHeaders(headers), cookies=self.RequestCookies(cookies), stream=stream)
         if stream is True:
             return r
         r.raise_for_status()
@@ -153,10 +964,8 @@ class Arlo(object):
         else:
             raise Exception(caller+' failed', body)
 
-    def post(self, url, body, caller, headers={}, cookies={}):
-        cookies.update(self.cookies)
-        headers.update(self.headers)
-        r = requests.post(url, json=body, cookies=cookies, headers=headers)
+    def post(self, url, body, caller, headers=None, cookies=None):
+        r = self.session.post(url, json=body, cookies=self.RequestCookies(cookies), headers=self.RequestHeaders(headers))
         r.raise_for_status()
         body = r.json()
         if body['success'] == True:
@@ -168,10 +977,8 @@ class Arlo(object):
         else:
             raise Exception(caller+' failed', body)
 
-    def put(self, url, body, caller, headers={}, cookies={}):
-        cookies.update(self.cookies)
-        headers.update(self.headers)
-        r = requests.put(url, json=body, cookies=cookies, headers=headers)
+    def put(self, url, body, caller, headers=None, cookies=None):
+        r = self.session.put(url, json=body, cookies=self.RequestCookies(cookies), headers=self.RequestHeaders(headers))
         r.raise_for_status()
         body = r.json()
         if body['success'] == True:
@@ -180,6 +987,18 @@ class Arlo(object):
         else:
             raise Exception(caller+' failed', body)
 
+    def RequestHeaders(self, headers=None):
+        merged = dict(self.headers)
+        if headers:
+            merged.update(headers)
+        return merged
+
+    def RequestCookies(self, cookies=None):
+        merged = dict(self.cookies)
+        if cookies:
+            merged.update(cookies)
+        return merged
+
     ##
     # This call returns the following:
     #{
@@ -209,6 +1028,8 @@ class Arlo(object):
         }
 
         self.user_id = body['userId']
+        # The templates have the old user id and token baked in.
+        self.notify_templates = {}
         return body
 
     def Logout(self):
@@ -229,7 +1050,6 @@ class Arlo(object):
     #
     # You generally shouldn't need to call Subscribe() directly, although I'm leaving it "public" for now.
     ##
-    
     def Subscribe(self, basestation):
         basestation_id = basestation.get('deviceId') 
 
@@ -237,27 +1057,50 @@ class Arlo(object):
             if basestation_id in self.event_streams and self.event_streams[basestation_id].connected:
                 self.Notify(basestation, {"action":"set","resource":"subscriptions/"+self.user_id+"_web","publishResponse":False,"properties":{"devices":[basestation_id]}})
                 event = self.event_streams[basestation_id].Get(block=True, timeout=120)
-                if event:
+                if event is not None:
                     self.event_streams[basestation_id].Register()
                 return event
 
+        def QueueEvent(self, data):
+            response = StreamEvent(data)
+            if basestation_id in self.event_streams:
+                if self.event_streams[basestation_id].connected:
+                    if response.get('action') == 'logout':
+                        self.event_streams[basestation_id].Disconnect()
+                        return
+                    handlers = self.event_handlers.get(basestation_id)
+                    if handlers:
+                        for handler in handlers:
+                            handler.Push(response)
+                        # The handlers get every event, so the queue is only needed by NotifyAndGetResponse(), which is
+                        # waiting for the responses to this process's Notify() calls.
+                        if not (response.get('transId') or '').startswith(self.TRANSID_PREFIX+'!'+self.TRANSID_SEED):
+                            return
+                    self.event_streams[basestation_id].queue.put(response)
+                elif response.get('status') == 'connected':
+                    self.event_streams[basestation_id].Connect()
+
         def QueueEvents(self, event_stream):
             for event in event_stream:
-                response = json.loads(event.data)
-                if basestation_id in self.event_streams:
-                    if self.event_streams[basestation_id].connected:
-                        if response.get('action') == 'logout':
-                            self.event_streams[basestation_id].Disconnect()
-                        else:
-                            self.event_streams[basestation_id].queue.put(response)
-                    elif response.get('status') == 'connected':
-                        self.event_streams[basestation_id].Connect()
+                QueueEvent(self, event.data)
 
         if basestation_id not in self.event_streams or not self.event_streams[basestation_id].connected:
-            event_stream = sseclient.SSEClient('https://arlo.netgear.com/hmsweb/client/subscribe?token='+self.headers['Authorization'], cookies=self.cookies)
-            self.event_streams[basestation_id] = EventStream(QueueEvents, args=(self, event_stream,))
-            self.event_streams[basestation_id].Start()
+            url = 'https://arlo.netgear.com/hmsweb/client/subscribe?token='+self.headers['Authorization']
+            connection = None
+            if self.event_hub is not None:
+                self.event_streams[basestation_id] = EventStream(None, None)
+                cookies = '; '.join(name+'='+value for name, value in dict(self.cookies).items())
+                connection = self.event_hub.Open(url, {'Cookie':cookies}, lambda data: QueueEvent(self, data), self.event_streams[basestation_id].Disconnect)
+                self.event_streams[basestation_id].connection = connection
+            else:
+                event_stream = sseclient.SSEClient(url, cookies=self.cookies)
+                self.event_streams[basestation_id] = EventStream(QueueEvents, args=(self, event_stream,))
+                self.event_streams[basestation_id].Start()
+            deadline = monotonic.monotonic() + 120
             while not self.event_streams[basestation_id].connected:
+                if connection is not None and (connection.closed or monotonic.monotonic() > deadline):
+                    self.event_streams[basestation_id].Disconnect()
+                    raise Exception('Subscribe failed', 'the EventStream closed before it connected', connection.error)
                 time.sleep(1)
 
         if not self.event_streams[basestation_id].registered:
@@ -312,14 +1155,29 @@ class Arlo(object):
     #   motionSetupModeSensitivity (int 0-100) - Motion Detection Sensitivity
     ##
     def Notify(self, basestation, body): 
-        basestation_id = basestation.get('deviceId')
+        url, headers, envelope = self.NotifyTemplate(basestation)
 
+        body.update(envelope)
         body['transId'] = self.genTransId()
-        body['from'] = self.user_id+'_web'
-        body['to'] = basestation_id
 
-        self.post('https://arlo.netgear.com/hmsweb/users/devices/notify/'+body['to'], body, 'Notify', headers={"xcloudId":basestation.get('xCloudId')})
-        return body.get('transId')
+        self.post(url, body, 'Notify', headers=headers)
+        return body['transId']
+
+    ##
+    # Returns the url, headers and "from"/"to" fields Notify() uses for the basestation.
+    # These are the same for every call, so they're built once per basestation and cached until the next Login().
+    ##
+    def NotifyTemplate(self, basestation):
+        basestation_id = basestation.get('deviceId')
+        xcloud_id = basestation.get('xCloudId')
+
+        template = self.notify_templates.get(basestation_id)
+        if template is None or template[1]['xcloudId'] != xcloud_id:
+            headers = dict(self.headers)
+            headers['xcloudId'] = xcloud_id
+            template = ('https://arlo.netgear.com/hmsweb/users/devices/notify/'+basestation_id, headers, {'from':self.user_id+'_web', 'to':basestation_id})
+            self.notify_templates[basestation_id] = template
+        return template
 
     def NotifyAndGetResponse(self, basestation, body, timeout=120):
         basestation_id = basestation.get('deviceId')
@@ -333,7 +1191,8 @@ class Arlo(object):
                 self.event_streams[basestation_id].queue.put(event)
                 event = self.event_streams[basestation_id].Get(block=True, timeout=timeout)
 
-            return event
+            if event is not None:
+                return event.body
 
     # Use this method to subscribe to motion events. You must provide a callback function which will get called once per motion event.
     #
@@ -347,22 +1206,63 @@ class Arlo(object):
             if event.get('properties', {}).get('motionDetected'):
                 callback(self, basestation, event)
 
-        self.HandleEvents(basestation, callbackwrapper, timeout)
+        self.HandleEvents(basestation, callbackwrapper, timeout, resources=['cameras/'])
 
     # Use this method to subscribe to the event stream and provide a callback that will be called for event event received.
     # This function will allow you to potentially write a callback that can handle all of the events received from the event stream. 
-    def HandleEvents(self, basestation, callback, timeout=None):
+    #
+    # If you only care about some resources (e.g. ['cameras/', 'modes']), pass them in resources and the other events will be
+    # skipped without being decoded. Responses to our own Notify() calls are always passed to the callback.
+    def HandleEvents(self, basestation, callback, timeout=None, resources=None):
         if not callable(callback):
             raise Exception('The callback(self, basestation, event) should be a callable function!')
 
         basestation_id = basestation.get('deviceId')
+        if resources is not None:
+            resources = tuple(resources)
 
         self.Subscribe(basestation)
         if basestation_id in self.event_streams and self.event_streams[basestation_id].connected and self.event_streams[basestation_id].registered:
             while basestation_id in self.event_streams and self.event_streams[basestation_id].connected:
                 event = self.event_streams[basestation_id].Get(block=True, timeout=timeout)
-                if event:
-                    callback(self, basestation, event)
+                if event is None:
+                    continue
+                # Check resource first, so transId is only looked up for events that would otherwise be skipped.
+                if resources is not None and not (event.get('resource') or '').startswith(resources) and not (event.get('transId') or '').startswith(self.TRANSID_PREFIX+'!'):
+                    continue
+                callback(self, basestation, event.body)
+
+    ##
+    # Like HandleEvents(), but doesn't block: callback(self, basestation, event) is called for each event (see EventHandler)
+    # until RemoveEventHandler() is called with the handler this returns. This is the way to consume events from an
+    # ArloPool, since the callbacks run on the pool's workers instead of needing a thread per basestation.
+    #
+    # Don't use HandleEvents() for the same basestation while it has handlers, since they get the events instead of it.
+    # If the EventStream disconnects, the handlers stay registered and get events again once Subscribe() reconnects it.
+    ##
+    def AddEventHandler(self, basestation, callback, resources=None):
+        if not callable(callback):
+            raise Exception('The callback(self, basestation, event) should be a callable function!')
+
+        basestation_id = basestation.get('deviceId')
+        handler = EventHandler(self, basestation, callback, resources)
+        with self.event_handlers_lock:
+            self.event_handlers[basestation_id] = self.event_handlers.get(basestation_id, []) + [handler]
+        try:
+            self.Subscribe(basestation)
+        except Exception:
+            self.RemoveEventHandler(handler)
+            raise
+        return handler
+
+    def RemoveEventHandler(self, handler):
+        basestation_id = handler.basestation.get('deviceId')
+        with self.event_handlers_lock:
+            handlers = [ h for h in self.event_handlers.get(basestation_id, []) if h is not handler ]
+            if handlers:
+                self.event_handlers[basestation_id] = handlers
+            else:
+                self.event_handlers.pop(basestation_id, None)
 
     def GetBaseStationState(self, basestation):
         return self.NotifyAndGetResponse(basestation, {"action":"get","resource":"basestation","publishResponse":False})
@@ -457,17 +1357,34 @@ class Arlo(object):
     ##
     # This method returns an array that contains the basestation, cameras, etc. and their metadata.
     # If you pass in a valid device type ('basestation', 'camera', etc.), this method will return an array of just those devices that match that type.
+    #
+    # Pass as_records=True to get back Device objects instead of dicts (see Record).
     ##
-    def GetDevices(self, device_type=None):
+    def GetDevices(self, device_type=None, as_records=False):
         devices = self.get('https://arlo.netgear.com/hmsweb/users/devices', 'GetDevices')
         if device_type:
-            return [ device for device in devices if device['deviceType'] == device_type]
+            devices = [ device for device in devices if device['deviceType'] == device_type]
 
+        if as_records:
+            return Device.FromList(devices)
         return devices
 
     def GetLibraryMetaData(self, from_date, to_date):
         return self.post('https://arlo.netgear.com/hmsweb/users/library/metadata', {'dateFrom':from_date, 'dateTo':to_date}, 'GetLibraryMetaData')
 
+    ##
+    # Same as GetLibraryMetaData(), but the date range is split into shards that are fetched concurrently (see QueryLibraryShards()).
+    # Yields the items of each shard's response as it arrives ((date, metadata) pairs if Arlo returns an object, entries if it returns a list).
+    ##
+    def StreamLibraryMetaData(self, from_date, to_date, days_per_shard=1, concurrency=4, ordered=False):
+        for shard in self.QueryLibraryShards('https://arlo.netgear.com/hmsweb/users/library/metadata', 'GetLibraryMetaData', from_date, to_date, days_per_shard, concurrency, ordered):
+            if isinstance(shard, dict):
+                for item in shard.items():
+                    yield item
+            elif shard:
+                for item in shard:
+                    yield item
+
     def UpdateProfile(self, first_name, last_name):
         return self.put('https://arlo.netgear.com/hmsweb/users/profile', {'firstName': first_name, 'lastName': last_name}, 'UpdateProfile')
 
@@ -538,9 +1455,100 @@ class Arlo(object):
     #  "mediaDuration": "00:00:30"
     # }
     #]
+    #
+    # Pass as_records=True to get back Recording objects instead, which use a lot less memory for large date ranges (see Record).
+    ##
+    def GetLibrary(self, from_date, to_date, as_records=False):
+        library = self.post('https://arlo.netgear.com/hmsweb/users/library', {'dateFrom':from_date, 'dateTo':to_date}, 'GetLibrary')
+        if as_records:
+            return Recording.FromList(library)
+        return library
+
+    ##
+    # Same as GetLibrary(), but for large date ranges.
+    #
+    # The range is split into shards of days_per_shard days, up to concurrency of them are fetched at a time over the pooled
+    # session, and this generator yields the recordings of each shard as soon as it completes, so the whole library never has
+    # to be in memory at once. Shards are yielded in the order they complete unless ordered=True, in which case they're
+    # yielded in date order.
+    #
+    # for recording in arlo.StreamLibrary('20170101', '20170331', concurrency=8):
+    #     print(recording['name'])
+    ##
+    def StreamLibrary(self, from_date, to_date, days_per_shard=1, concurrency=4, ordered=False, as_records=False):
+        for shard in self.QueryLibraryShards('https://arlo.netgear.com/hmsweb/users/library', 'GetLibrary', from_date, to_date, days_per_shard, concurrency, ordered):
+            for recording in shard or []:
+                yield Recording(recording) if as_records else recording
+
+    ##
+    # POSTs {'dateFrom', 'dateTo'} to url once per shard of the date range, with up to concurrency requests in flight, and
+    # yields each shard's response data as it completes. If a shard fails, the exception is raised from the generator.
+    # Closing the generator early stops any more shards from being fetched.
+    #
+    # The requests run on self.executor if the client has one (see ArloPool), otherwise on a FairExecutor that only lives
+    # as long as the query. While waiting, the calling thread runs shards that haven't been picked up yet itself, so this
+    # can't deadlock when it's called from a job on a busy executor.
     ##
-    def GetLibrary(self, from_date, to_date):
-        return self.post('https://arlo.netgear.com/hmsweb/users/library', {'dateFrom':from_date, 'dateTo':to_date}, 'GetLibrary')
+    def QueryLibraryShards(self, url, caller, from_date, to_date, days_per_shard=1, concurrency=4, ordered=False):
+        shards = list(enumerate(date_shards(from_date, to_date, days_per_shard)))
+        shards.reverse()
+        results = queue.Queue()
+        stopped = threading.Event()
+        executor = self.executor
+        if executor is None:
+            executor = FairExecutor(min(max(1, concurrency), len(shards) or 1))
+        jobs = []
+
+        def Fetch(index, shard_from, shard_to):
+            if stopped.is_set():
+                return
+            try:
+                results.put((index, self.post(url, {'dateFrom':shard_from, 'dateTo':shard_to}, caller), None))
+            except Exception as e:
+                results.put((index, None, e))
+
+        def SubmitNext():
+            if shards:
+                index, (shard_from, shard_to) = shards.pop()
+                jobs.append(executor.Submit(getattr(self, 'username', None), Fetch, index, shard_from, shard_to))
+
+        def NextResult():
+            while True:
+                try:
+                    return results.get(block=False)
+                except queue.Empty:
+                    pass
+                for job in jobs:
+                    if job.Claim():
+                        job.Run()
+                        break
+                else:
+                    return results.get()
+
+        try:
+            total = len(shards)
+            for i in range(max(1, concurrency)):
+                SubmitNext()
+
+            completed = {}
+            next_index = 0
+            for i in range(total):
+                index, data, error = NextResult()
+                jobs[:] = [ job for job in jobs if not job.Done() ]
+                SubmitNext()
+                if error is not None:
+                    raise error
+                if not ordered:
+                    yield data
+                    continue
+                completed[index] = data
+                while next_index in completed:
+                    yield completed.pop(next_index)
+                    next_index += 1
+        finally:
+            stopped.set()
+            if executor is not self.executor:
+                executor.Shutdown(wait=False)
 
     ##
     # Delete a single video recording from Arlo.
@@ -569,8 +1577,11 @@ class Arlo(object):
     #    "deviceId":"XXXXXXXXXXXXX"
     #  }
     #]
+    #
+    # Recording objects from GetLibrary(as_records=True) can be passed in too.
     ##
     def BatchDeleteRecordings(self, recording_metadata):
+        recording_metadata = [ recording.ToDeleteDict() if isinstance(recording, Recording) else recording for recording in recording_metadata ]
         return self.post('https://arlo.netgear.com/hmsweb/users/library/recycle', {'data':recording_metadata}, 'BatchDeleteRecordings')
 
     ##
@@ -580,7 +1591,7 @@ class Arlo(object):
     ##
     def GetRecording(self, url, chunk_size=4096):
         video = ''
-        r = requests.get(url, stream=True)
+        r = self.session.get(url, stream=True)
         r.raise_for_status()
 
         for chunk in r.iter_content(chunk_size):
@@ -593,7 +1604,7 @@ class Arlo(object):
     # Obviously, this function is generic and could be used to download anything. :)
     ##
     def StreamRecording(self, url, chunk_size=4096):
-        r = requests.get(url, stream=True)
+        r = self.session.get(url, stream=True)
         r.raise_for_status()
         for chunk in r.iter_content(chunk_size):
             yield chunk
@@ -621,8 +1632,18 @@ class Arlo(object):
     #{ "url":"rtmps://vzwow09-z2-prod.vz.netgear.com:80/vzmodulelive?egressToken=b1b4b675_ac03_4182_9844_043e02a44f71&userAgent=web&cameraId=48B4597VD8FF5_1473010750131" }
     #
     ##
+    #
+    # NOTE: This always starts a new stream. TakeSnapshot() and StartRecording() reuse the camera's active stream if it has
+    # one (see StreamManager), which you can do too with session = self.streams.Acquire(camera) and self.streams.Release(session).
+    ##
     def StartStream(self, camera):
-        return self.post('https://arlo.netgear.com/hmsweb/users/devices/startStream', {"to":camera.get('parentId'),"from":self.user_id+"_web","resource":"cameras/"+camera.get('deviceId'),"action":"set","publishResponse":True,"transId":self.genTransId(),"properties":{"activityState":"startUserStream","cameraId":camera.get('deviceId')}}, 'gc', headers={"xcloudId":camera.get('xCloudId')})
+        return self.post('https://arlo.netgear.com/hmsweb/users/devices/startStream', {"to":camera.get('parentId'),"from":self.user_id+"_web","resource":"cameras/"+camera.get('deviceId'),"action":"set","publishResponse":True,"transId":self.genTransId(),"properties":{"activityState":"startUserStream","cameraId":camera.get('deviceId')}}, 'StartStream', headers={"xcloudId":camera.get('xCloudId')})
+
+    ##
+    # This function puts the camera's stream back to idle, so the camera can go back to sleep.
+    ##
+    def StopStream(self, camera):
+        return self.Notify({'deviceId':camera.get('parentId'),'xCloudId':camera.get('xCloudId')}, {"action":"set","resource":"cameras/"+camera.get('deviceId'),"publishResponse":True,"properties":{"activityState":"idle"}})
 
     ##
     # This function causes the camera to record a snapshot.
@@ -630,19 +1651,37 @@ class Arlo(object):
     # You can get the timezone from GetDevices().
     ##
     def TakeSnapshot(self, camera):
-        stream_url = self.StartStream(camera)
-        self.post('https://arlo.netgear.com/hmsweb/users/devices/takeSnapshot', {'xcloudId':camera.get('xCloudId'),'parentId':camera.get('parentId'),'deviceId':camera.get('deviceId'),'olsonTimeZone':camera.get('properties', {}).get('olsonTimeZone')}, 'TakeSnapshot', headers={"xcloudId":camera.get('xCloudId')})
-        return stream_url;
+        session = self.streams.Acquire(camera)
+        try:
+            self.post('https://arlo.netgear.com/hmsweb/users/devices/takeSnapshot', {'xcloudId':camera.get('xCloudId'),'parentId':camera.get('parentId'),'deviceId':camera.get('deviceId'),'olsonTimeZone':camera.get('properties', {}).get('olsonTimeZone')}, 'TakeSnapshot', headers={"xcloudId":camera.get('xCloudId')})
+        except Exception:
+            # The cached stream may be dead, don't hand it out again.
+            self.streams.Invalidate(session)
+            raise
+        finally:
+            self.streams.Release(session)
+        return session.stream;
 
     ##
     # This function causes the camera to start recording.
     #
+    # The camera's stream is kept alive until StopRecording() is called.
+    #
     # You can get the timezone from GetDevices().
     ##
     def StartRecording(self, camera):
-        stream_url = self.StartStream(camera)
-        self.post('https://arlo.netgear.com/hmsweb/users/devices/startRecord', {'xcloudId':camera.get('xCloudId'),'parentId':camera.get('parentId'),'deviceId':camera.get('deviceId'),'olsonTimeZone':camera.get('properties', {}).get('olsonTimeZone')}, 'StartRecording', headers={"xcloudId":camera.get('xCloudId')})
-        return stream_url
+        session = self.streams.Acquire(camera)
+        try:
+            self.post('https://arlo.netgear.com/hmsweb/users/devices/startRecord', {'xcloudId':camera.get('xCloudId'),'parentId':camera.get('parentId'),'deviceId':camera.get('deviceId'),'olsonTimeZone':camera.get('properties', {}).get('olsonTimeZone')}, 'StartRecording', headers={"xcloudId":camera.get('xCloudId')})
+        except Exception:
+            self.streams.Invalidate(session)
+            self.streams.Release(session)
+            raise
+        previous = self.recording_streams.pop(camera.get('deviceId'), None)
+        self.recording_streams[camera.get('deviceId')] = session
+        if previous is not None:
+            self.streams.Release(previous)
+        return session.stream
 
     ##
     # This function causes the camera to stop recording.
@@ -650,4 +1689,264 @@ class Arlo(object):
     # You can get the timezone from GetDevices().
     ##
     def StopRecording(self, camera):
-        return self.post('https://arlo.netgear.com/hmsweb/users/devices/stopRecord', {'xcloudId':camera.get('xCloudId'),'parentId':camera.get('parentId'),'deviceId':camera.get('deviceId'),'olsonTimeZone':camera.get('properties', {}).get('olsonTimeZone')}, 'StopRecording', headers={"xcloudId":camera.get('xCloudId')})
+        try:
+            return self.post('https://arlo.netgear.com/hmsweb/users/devices/stopRecord', {'xcloudId':camera.get('xCloudId'),'parentId':camera.get('parentId'),'deviceId':camera.get('deviceId'),'olsonTimeZone':camera.get('properties', {}).get('olsonTimeZone')}, 'StopRecording', headers={"xcloudId":camera.get('xCloudId')})
+        finally:
+            session = self.recording_streams.pop(camera.get('deviceId'), None)
+            if session is not None:
+                self.streams.Release(session)
+
+##
+# A unit of work submitted to a FairExecutor. Call Result() to wait for it to finish.
+##
+class Job(object):
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.claimed = False
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+
+    # Returns True if the caller gets to run the job, i.e. nobody else has claimed it yet.
+    def Claim(self):
+        with self.lock:
+            if self.claimed:
+                return False
+            self.claimed = True
+            return True
+
+    def Run(self):
+        try:
+            self.result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished.set()
+
+    def Done(self):
+        return self.finished.is_set()
+
+    def Result(self, timeout=None):
+        if not self.finished.wait(timeout):
+            raise Exception('Job timed out', timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+##
+# Token bucket that allows rate calls per second, with bursts of up to burst calls.
+##
+class RateLimiter(object):
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = monotonic.monotonic()
+
+    # Returns how many seconds until a call is allowed (0 if one is allowed now).
+    def Delay(self):
+        now = monotonic.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def Take(self):
+        self.tokens -= 1
+
+##
+# A fixed-size pool of worker threads that runs jobs queued under a key (e.g. an account's username).
+#
+# Keys with pending jobs are served round-robin, so one account with thousands of queued jobs can't starve the others,
+# and each key can have its own RateLimiter.
+##
+class FairExecutor(object):
+    def __init__(self, workers=8, rate=None, burst=1):
+        self.condition = threading.Condition()
+        self.queues = {}
+        self.ready = collections.deque()
+        self.limiters = {}
+        self.rate = rate
+        self.burst = burst
+        self.shutdown = False
+        self.workers = []
+        for i in range(max(1, workers)):
+            worker = threading.Thread(name="FairExecutor", target=self.Work)
+            worker.setDaemon(True)
+            worker.start()
+            self.workers.append(worker)
+
+    # Sets the rate limit (calls per second) for a key. Pass None to remove it.
+    def SetRateLimit(self, key, rate, burst=1):
+        with self.condition:
+            if rate is None:
+                self.limiters[key] = None
+            else:
+                self.limiters[key] = RateLimiter(rate, burst)
+            self.condition.notify_all()
+
+    def Submit(self, key, fn, *args, **kwargs):
+        job = Job(fn, args, kwargs)
+        with self.condition:
+            if self.shutdown:
+                raise Exception('Submit failed', 'executor is shut down')
+            if key not in self.queues:
+                self.queues[key] = collections.deque()
+            if not self.queues[key]:
+                self.ready.append(key)
+            self.queues[key].append(job)
+            self.condition.notify()
+        return job
+
+    def Shutdown(self, wait=True):
+        with self.condition:
+            self.shutdown = True
+            self.condition.notify_all()
+        if wait:
+            for worker in self.workers:
+                worker.join()
+
+    def Next(self):
+        with self.condition:
+            while True:
+                if self.shutdown and not self.ready:
+                    return None
+                wait = None
+                for i in range(len(self.ready)):
+                    key = self.ready[0]
+                    self.ready.rotate(-1)
+                    if key not in self.limiters and self.rate is not None:
+                        self.limiters[key] = RateLimiter(self.rate, self.burst)
+                    limiter = self.limiters.get(key)
+                    delay = limiter.Delay() if limiter is not None else 0
+                    if delay > 0:
+                        wait = delay if wait is None else min(wait, delay)
+                        continue
+                    if limiter is not None:
+                        limiter.Take()
+                    job = self.queues[key].popleft()
+                    if not self.queues[key]:
+                        # rotate() just moved this key to the end.
+                        self.ready.pop()
+                    return job
+                self.condition.wait(wait)
+
+    def Work(self):
+        while True:
+            job = self.Next()
+            if job is None:
+                return
+            if job.Claim():
+                job.Run()
+
+##
+# Manages Arlo clients for many accounts in one process.
+#
+# Clients are created (and logged in) the first time they're used, and all of them share one HTTP connection pool, one
+# FairExecutor for running calls and one EventHub for their EventStreams, so the number of threads stays the same no
+# matter how many accounts are added.
+#
+# pool = ArloPool(workers=16, rate=2)
+# pool.Add('user1@example.com', 'password1')
+# pool.Add('user2@example.com', 'password2')
+# jobs = pool.SubmitAll(lambda arlo: arlo.GetDevices('basestation'))
+# for username, job in jobs.items():
+#     print(username, job.Result())
+##
+class ArloPool(object):
+    def __init__(self, workers=8, event_threads=1, rate=None, burst=1, pool_size=None):
+        pool_size = pool_size or max(Arlo.POOL_SIZE, workers)
+        self.adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.executor = FairExecutor(workers, rate, burst)
+        self.event_hub = EventHub(event_threads)
+        self.lock = threading.Lock()
+        self.credentials = {}
+        self.clients = {}
+        self.client_locks = {}
+        # One thread stops idle live streams for every client, instead of a reaper thread per client.
+        self.stopped = threading.Event()
+        self.reaper = threading.Thread(name="ArloPool", target=self.RunReaper)
+        self.reaper.setDaemon(True)
+        self.reaper.start()
+
+    def Add(self, username, password, rate=None, burst=1):
+        with self.lock:
+            self.credentials[username] = password
+            self.client_locks[username] = threading.Lock()
+        if rate is not None:
+            self.executor.SetRateLimit(username, rate, burst)
+
+    def Remove(self, username):
+        with self.lock:
+            self.credentials.pop(username, None)
+            self.client_locks.pop(username, None)
+            arlo = self.clients.pop(username, None)
+        if arlo is not None:
+            self.Disconnect(arlo)
+
+    # Closes the client's EventStreams, so the hub stops reading them.
+    def Disconnect(self, arlo):
+        for event_stream in list(arlo.event_streams.values()):
+            event_stream.Disconnect()
+
+    def Usernames(self):
+        with self.lock:
+            return list(self.credentials)
+
+    ##
+    # Returns the Arlo client for the account, logging in if this is the first time it's been used.
+    ##
+    def Get(self, username):
+        with self.lock:
+            if username in self.clients:
+                return self.clients[username]
+            if username not in self.credentials:
+                raise Exception('Get failed', 'unknown account '+username)
+            password = self.credentials[username]
+            client_lock = self.client_locks[username]
+
+        with client_lock:
+            with self.lock:
+                if username in self.clients:
+                    return self.clients[username]
+            arlo = Arlo(username, password, adapter=self.adapter, event_hub=self.event_hub, executor=self.executor)
+            with self.lock:
+                self.clients[username] = arlo
+            return arlo
+
+    ##
+    # Runs fn(arlo, *args, **kwargs) for the account on the shared executor and returns a Job.
+    ##
+    def Submit(self, username, fn, *args, **kwargs):
+        return self.executor.Submit(username, lambda: fn(self.Get(username), *args, **kwargs))
+
+    ##
+    # Submits fn for each of the usernames (default: every account) and returns a dict of username -> Job.
+    ##
+    def SubmitAll(self, fn, usernames=None, *args, **kwargs):
+        if usernames is None:
+            usernames = self.Usernames()
+        return dict((username, self.Submit(username, fn, *args, **kwargs)) for username in usernames)
+
+    def RunReaper(self, interval=5):
+        while not self.stopped.wait(interval):
+            with self.lock:
+                clients = list(self.clients.values())
+            for arlo in clients:
+                try:
+                    arlo.streams.Reap()
+                except Exception:
+                    log.exception('ArloPool: stopping idle streams failed')
+
+    def Close(self):
+        self.stopped.set()
+        with self.lock:
+            clients = list(self.clients.values())
+        for arlo in clients:
+            self.Disconnect(arlo)
+        self.executor.Shutdown(wait=False)
+        self.event_hub.Stop()
@@ -0,0 +1,382 @@
+##
+# Copyright 2016 Jeffrey D. Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+##
+
+##
+# Command line tool for bulk operations on an Arlo account.
+#
+# $ arlo --username user@example.com --password secret download --from 20170101 --to 20170131 --concurrency 8
+# $ ARLO_USERNAME=user@example.com ARLO_PASSWORD=secret arlo --json arm
+#
+# Every command prints a timing summary when it's done. With --json, the results and the summary are printed as a single
+# JSON object instead (the events command prints one JSON object per event), so the output can be used from scripts.
+##
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import json
+import monotonic
+import os
+import sys
+import threading
+
+from Arlo import Arlo, FairExecutor, Record
+
+##
+# Collects the timings of the operations run by a command.
+##
+class Summary(object):
+    def __init__(self):
+        self.started = monotonic.monotonic()
+        self.lock = threading.Lock()
+        self.durations = []
+        self.failed = 0
+
+    def Add(self, duration, ok=True):
+        with self.lock:
+            self.durations.append(duration)
+            if not ok:
+                self.failed += 1
+
+    def Timed(self, fn, *args, **kwargs):
+        started = monotonic.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.Add(monotonic.monotonic() - started, ok=False)
+            raise
+        self.Add(monotonic.monotonic() - started)
+        return result
+
+    def ToDict(self):
+        with self.lock:
+            durations = sorted(self.durations)
+            failed = self.failed
+        elapsed = monotonic.monotonic() - self.started
+
+        def percentile(p):
+            if not durations:
+                return None
+            return durations[min(len(durations) - 1, int(len(durations) * p))]
+
+        return {
+            'count':len(durations),
+            'ok':len(durations) - failed,
+            'failed':failed,
+            'elapsed':elapsed,
+            'perSecond':len(durations) / elapsed if elapsed > 0 else None,
+            'avg':sum(durations) / len(durations) if durations else None,
+            'p50':percentile(0.5),
+            'p95':percentile(0.95),
+            'max':durations[-1] if durations else None
+        }
+
+def format_summary(summary):
+    def seconds(value):
+        return '-' if value is None else '%.3fs' % value
+    return '%d ok, %d failed in %.2fs (avg %s, p50 %s, p95 %s, max %s)' % (summary['ok'], summary['failed'], summary['elapsed'],
+        seconds(summary['avg']), seconds(summary['p50']), seconds(summary['p95']), seconds(summary['max']))
+
+# Records from GetLibrary(as_records=True) etc. aren't dicts, so json needs to be told how to handle them.
+def json_default(value):
+    if isinstance(value, Record):
+        return dict(value)
+    return str(value)
+
+def days_ago(days):
+    return (datetime.date.today() - datetime.timedelta(days=days)).strftime('%Y%m%d')
+
+def recording_key(recording):
+    return recording.get('deviceId')+'_'+str(recording.get('name'))
+
+def recording_filename(recording):
+    return datetime.datetime.fromtimestamp(int(recording['name']) // 1000).strftime('%Y-%m-%d %H-%M-%S')+' '+recording['uniqueId']+'.mp4'
+
+def select_devices(arlo, device_type, device_ids):
+    devices = arlo.GetDevices(device_type)
+    if device_ids:
+        devices = [ device for device in devices if device.get('deviceId') in device_ids or device.get('deviceName') in device_ids ]
+    return devices
+
+##
+# Runs fn(item) for every item on concurrency threads and returns a list of {'id', 'ok', 'result'/'error', 'time'} dicts.
+# Items are queued under key(item), so the executor spreads the work evenly across e.g. cameras.
+##
+def fan_out(items, fn, concurrency, summary, key=lambda item: None, describe=lambda item: item):
+    executor = FairExecutor(concurrency)
+    jobs = []
+    for item in items:
+        jobs.append((item, executor.Submit(key(item), run_timed, summary, fn, item)))
+
+    results = []
+    for item, job in jobs:
+        result, duration, error = job.Result()
+        entry = {'id':describe(item), 'ok':error is None, 'time':duration}
+        if error is None:
+            entry['result'] = result
+        else:
+            entry['error'] = str(error)
+        results.append(entry)
+    executor.Shutdown()
+    return results
+
+def run_timed(summary, fn, item):
+    started = monotonic.monotonic()
+    try:
+        result = fn(item)
+    except Exception as e:
+        duration = monotonic.monotonic() - started
+        summary.Add(duration, ok=False)
+        return None, duration, e
+    duration = monotonic.monotonic() - started
+    summary.Add(duration)
+    return result, duration, None
+
+##
+# Downloads a recording to path, resuming from a previous partial download (path+'.part') if there is one.
+##
+def download_recording(arlo, recording, path, chunk_size=65536):
+    if os.path.exists(path):
+        return {'file':path, 'skipped':True}
+
+    partial = path+'.part'
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    headers = {'Range':'bytes=%d-' % offset} if offset else {}
+    r = arlo.session.get(recording['presignedContentUrl'], headers=headers, stream=True)
+    # The partial file is already complete, we just didn't get to rename it last time.
+    if offset and r.status_code == 416:
+        r.close()
+        os.rename(partial, path)
+        return {'file':path, 'resumedAt':offset, 'bytes':offset}
+    r.raise_for_status()
+    # The server ignored the Range header, so start over.
+    if offset and r.status_code != 206:
+        offset = 0
+
+    with open(partial, 'ab' if offset else 'wb') as f:
+        for chunk in r.iter_content(chunk_size):
+            if chunk:
+                f.write(chunk)
+    os.rename(partial, path)
+    return {'file':path, 'resumedAt':offset, 'bytes':os.path.getsize(path)}
+
+def download(arlo, args, summary):
+    if not os.path.exists(args.dir):
+        os.makedirs(args.dir)
+
+    recordings = list(arlo.StreamLibrary(args.from_date, args.to_date, concurrency=args.concurrency, ordered=True))
+    return fan_out(recordings, lambda recording: download_recording(arlo, recording, os.path.join(args.dir, recording_filename(recording))),
+                   args.concurrency, summary, key=lambda recording: recording.get('deviceId'), describe=recording_key)
+
+##
+# Keeps a local index of the library up to date.
+#
+# The index is a JSON file that holds the last date that was synced and every recording keyed by deviceId and name.
+# Each run only fetches the days since the last sync (including the last synced day again, in case it was incomplete).
+##
+def sync(arlo, args, summary):
+    index = {'synced':None, 'recordings':{}}
+    if os.path.exists(args.index):
+        with open(args.index) as f:
+            index = json.load(f)
+
+    from_date = index['synced'] or args.from_date
+    to_date = datetime.date.today().strftime('%Y%m%d')
+
+    added = 0
+    for recording in summary.Timed(lambda: list(arlo.StreamLibrary(from_date, to_date, concurrency=args.concurrency))):
+        key = recording_key(recording)
+        if key not in index['recordings']:
+            added += 1
+        index['recordings'][key] = recording
+    index['synced'] = to_date
+
+    temp = args.index+'.tmp'
+    with open(temp, 'w') as f:
+        json.dump(index, f, default=json_default)
+    if os.path.exists(args.index):
+        os.remove(args.index)
+    os.rename(temp, args.index)
+
+    return [{'id':args.index, 'ok':True, 'result':{'from':from_date, 'to':to_date, 'added':added, 'total':len(index['recordings'])}}]
+
+def snapshot(arlo, args, summary):
+    cameras = select_devices(arlo, 'camera', args.cameras)
+    try:
+        return fan_out(cameras, arlo.TakeSnapshot, args.concurrency, summary, describe=lambda camera: camera.get('deviceId'))
+    finally:
+        # We're about to exit, so don't leave the cameras streaming until the reaper would have stopped them.
+        arlo.streams.StopAll()
+
+def set_mode(arlo, args, summary, method):
+    basestations = select_devices(arlo, 'basestation', args.basestations)
+    return fan_out(basestations, method, args.concurrency, summary, describe=lambda basestation: basestation.get('deviceId'))
+
+def arm(arlo, args, summary):
+    return set_mode(arlo, args, summary, arlo.Arm)
+
+def disarm(arlo, args, summary):
+    return set_mode(arlo, args, summary, arlo.Disarm)
+
+##
+# Prints (and optionally appends to a file) every event from the basestations' EventStreams, one JSON object per line.
+# Stops after --count events or --duration seconds, whichever comes first, or when every basestation's stream has ended.
+##
+def events(arlo, args, summary):
+    basestations = select_devices(arlo, 'basestation', args.basestations)
+    output = open(args.output, 'a') if args.output else None
+    lock = threading.Lock()
+    done = threading.Event()
+    received = [0]
+    last = [monotonic.monotonic()]
+
+    def callback(arlo, basestation, event):
+        line = json.dumps(event)
+        with lock:
+            now = monotonic.monotonic()
+            summary.Add(now - last[0])
+            last[0] = now
+            received[0] += 1
+            print(line)
+            sys.stdout.flush()
+            if output:
+                output.write(line+'\n')
+                output.flush()
+            if args.count and received[0] >= args.count:
+                done.set()
+
+    results = [ {'id':basestation.get('deviceId'), 'ok':True} for basestation in basestations ]
+    running = [len(basestations)]
+
+    def handle(basestation, result):
+        try:
+            arlo.HandleEvents(basestation, callback, resources=args.resources)
+        except Exception as e:
+            result['ok'] = False
+            result['error'] = str(e)
+        finally:
+            with lock:
+                running[0] -= 1
+                if running[0] == 0:
+                    done.set()
+
+    for basestation, result in zip(basestations, results):
+        thread = threading.Thread(name="Events", target=handle, args=(basestation, result))
+        thread.setDaemon(True)
+        thread.start()
+
+    if basestations:
+        done.wait(args.duration)
+    with lock:
+        if output:
+            output.close()
+            output = None
+    return results
+
+BENCH_OPERATIONS = {
+    'session':lambda arlo, args: arlo.GetSession(),
+    'devices':lambda arlo, args: arlo.GetDevices(),
+    'profile':lambda arlo, args: arlo.GetProfile(),
+    'library':lambda arlo, args: arlo.GetLibrary(days_ago(1), days_ago(0)),
+    'modes':lambda arlo, args: arlo.GetModes(arlo.GetDevices('basestation')[0])
+}
+
+def bench(arlo, args, summary):
+    def call(i):
+        BENCH_OPERATIONS[args.operation](arlo, args)
+
+    results = fan_out(range(args.requests), call, args.concurrency, summary)
+    # The individual results aren't interesting, just the failures.
+    return [ result for result in results if not result['ok'] ]
+
+COMMANDS = {
+    'download':download,
+    'sync':sync,
+    'snapshot':snapshot,
+    'arm':arm,
+    'disarm':disarm,
+    'events':events,
+    'bench':bench
+}
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='arlo', description='Bulk operations for Netgear Arlo cameras.')
+    parser.add_argument('--username', default=os.environ.get('ARLO_USERNAME'), help='Arlo account email (default: $ARLO_USERNAME)')
+    parser.add_argument('--password', default=os.environ.get('ARLO_PASSWORD'), help='Arlo account password (default: $ARLO_PASSWORD)')
+    parser.add_argument('--json', action='store_true', help='print the results and timing summary as JSON')
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--concurrency', type=int, default=4, help='number of requests to run at once (default: 4)')
+
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    p = commands.add_parser('download', parents=[common], help='download recordings from the library, resuming partial downloads')
+    p.add_argument('--from', dest='from_date', default=days_ago(7), help='first day to download, YYYYMMDD (default: 7 days ago)')
+    p.add_argument('--to', dest='to_date', default=days_ago(0), help='last day to download, YYYYMMDD (default: today)')
+    p.add_argument('--dir', default='videos', help='directory to save the recordings in (default: videos)')
+
+    p = commands.add_parser('sync', parents=[common], help='update a local JSON index of the library')
+    p.add_argument('--index', default='arlo-library.json', help='index file (default: arlo-library.json)')
+    p.add_argument('--from', dest='from_date', default=days_ago(30), help='first day to index if the index is new, YYYYMMDD (default: 30 days ago)')
+
+    p = commands.add_parser('snapshot', parents=[common], help='take a snapshot with many cameras at once')
+    p.add_argument('cameras', nargs='*', help='camera device ids or names (default: all cameras)')
+
+    for name, text in (('arm', 'arm basestations'), ('disarm', 'disarm basestations')):
+        p = commands.add_parser(name, parents=[common], help=text)
+        p.add_argument('basestations', nargs='*', help='basestation device ids or names (default: all basestations)')
+
+    # There's one stream per basestation, so --concurrency doesn't apply here.
+    p = commands.add_parser('events', help='print (and record) events from the basestations as JSON lines')
+    p.add_argument('basestations', nargs='*', help='basestation device ids or names (default: all basestations)')
+    p.add_argument('--output', help='also append the events to this file')
+    p.add_argument('--count', type=int, help='stop after this many events')
+    p.add_argument('--duration', type=float, help='stop after this many seconds')
+    p.add_argument('--resource', dest='resources', action='append', help='only show events for resources starting with this (can be repeated)')
+
+    p = commands.add_parser('bench', parents=[common], help='measure the latency and throughput of an API call')
+    p.add_argument('--operation', choices=sorted(BENCH_OPERATIONS), default='session', help='API call to make (default: session)')
+    p.add_argument('--requests', type=int, default=20, help='number of calls to make (default: 20)')
+
+    args = parser.parse_args(argv)
+    if not args.username or not args.password:
+        parser.error('--username and --password (or $ARLO_USERNAME and $ARLO_PASSWORD) are required')
+    return args
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    arlo = Arlo(args.username, args.password)
+    summary = Summary()
+    results = COMMANDS[args.command](arlo, args, summary)
+    totals = summary.ToDict()
+
+    if args.json:
+        print(json.dumps({'command':args.command, 'results':results, 'summary':totals}, default=json_default))
+    else:
+        for result in results:
+            if not result['ok']:
+                print('FAILED '+str(result['id'])+': '+result['error'], file=sys.stderr)
+            elif args.command not in ('events', 'bench'):
+                print(str(result['id'])+': '+json.dumps(result.get('result'), default=json_default))
+        print(args.command+': '+format_summary(totals), file=sys.stderr)
+
+    return 1 if totals['failed'] or not all(result['ok'] for result in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
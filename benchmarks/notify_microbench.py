@@ -0,0 +1,95 @@
+##
+# Compares the cost of building a Notify() request (transaction id, body and headers) the old way and the current way.
+# No requests are sent.
+#
+# Usage: python benchmarks/notify_microbench.py [iterations]
+##
+import datetime
+import math
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from Arlo import Arlo
+
+# genTransId() as it was before it was replaced with a counter.
+def legacy_gen_trans_id(trans_type=Arlo.TRANSID_PREFIX):
+    def float2hex(f):
+        MAXHEXADECIMALS = 15
+        w = f // 1
+        d = f % 1
+
+        # Do the whole:
+        if w == 0: result = '0'
+        else: result = ''
+        while w:
+            w, r = divmod(w, 16)
+            r = int(r)
+            if r > 9: r = chr(r+55)
+            else: r = str(r)
+            result =  r + result
+
+        # And now the part:
+        if d == 0: return result
+
+        result += '.'
+        count = 0
+        while d:
+            d = d * 16
+            w, d = divmod(d, 1)
+            w = int(w)
+            if w > 9: w = chr(w+55)
+            else: w = str(w)
+            result +=  w
+            count += 1
+            if count > MAXHEXADECIMALS: break
+
+        return result
+
+    now = datetime.datetime.today()
+    return trans_type+"!" + float2hex(random.random() * math.pow(2, 32)).lower() + "!" + str(int((time.mktime(now.timetuple())*1e3 + now.microsecond/1e3)))
+
+# What Notify() did before posting, before the request templates.
+def legacy_notify(arlo, basestation, body):
+    basestation_id = basestation.get('deviceId')
+
+    body['transId'] = legacy_gen_trans_id()
+    body['from'] = arlo.user_id+'_web'
+    body['to'] = basestation_id
+
+    headers = {"xcloudId":basestation.get('xCloudId')}
+    headers.update(arlo.headers)
+    return 'https://arlo.netgear.com/hmsweb/users/devices/notify/'+body['to'], body, headers
+
+# What Notify() does now before posting.
+def notify(arlo, basestation, body):
+    url, headers, envelope = arlo.NotifyTemplate(basestation)
+    body.update(envelope)
+    body['transId'] = arlo.genTransId()
+    headers.update(arlo.headers)
+    return url, body, headers
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    # Skip the constructor, it would log in.
+    arlo = Arlo.__new__(Arlo)
+    arlo.user_id = '336-4764296'
+    arlo.headers = {'DNT':'1', 'Host':'arlo.netgear.com', 'Referer':'https://arlo.netgear.com/', 'Authorization':'2_5HicFJMXXXXX'}
+    arlo.notify_templates = {}
+    basestation = {'deviceId':'48935B7SA9847', 'xCloudId':'XXXXXXXX-XXXX-XXX-XXXXXXXXX'}
+
+    benchmarks = (
+        ('genTransId (legacy)', lambda: legacy_gen_trans_id()),
+        ('genTransId', lambda: arlo.genTransId()),
+        ('Notify request (legacy)', lambda: legacy_notify(arlo, basestation, {"action":"set","resource":"modes","publishResponse":True,"properties":{"active":"mode1"}})),
+        ('Notify request', lambda: notify(arlo, basestation, {"action":"set","resource":"modes","publishResponse":True,"properties":{"active":"mode1"}}))
+    )
+
+    print('%-25s %12s' % ('benchmark', 'usec/call'))
+    for name, fn in benchmarks:
+        seconds = min(timeit.repeat(fn, number=iterations, repeat=3))
+        print('%-25s %12.3f' % (name, seconds / iterations * 1e6))
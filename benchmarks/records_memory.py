@@ -0,0 +1,61 @@
+##
+# Measures the memory used by 100k GetLibrary() entries kept as plain dicts vs. Recording objects.
+#
+# Usage: python benchmarks/records_memory.py [count]
+##
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from Arlo import Recording
+
+def library_json(count):
+    recordings = []
+    for i in range(count):
+        device_id = '48B45974D%04d' % (i % 8)
+        utc_created_date = 1472881400000 + i * 1000
+        recordings.append({
+            "mediaDurationSecond": 30,
+            "contentType": "video/mp4",
+            "name": str(utc_created_date),
+            "presignedContentUrl": "https://arlos3-prod-z2.s3.amazonaws.com/XXXXXXX/336-4764296/"+device_id+"/recordings/"+str(utc_created_date)+".mp4?AWSAccessKeyId=XXXXXXXXXXXXXXXXXXXX&Expires=1472968703&Signature=XXXXXXXXXXXXXXXXXXXXXXXXXXXX",
+            "lastModified": utc_created_date + 500,
+            "localCreatedDate": utc_created_date - 18000000,
+            "presignedThumbnailUrl": "https://arlos3-prod-z2.s3.amazonaws.com/XXXXXXX/336-4764296/"+device_id+"/recordings/"+str(utc_created_date)+"_thumb.jpg?AWSAccessKeyId=XXXXXXXXXXXXXXXXXXXX&Expires=1472968703&Signature=XXXXXXXXXXXXXXXXXXXXXXXXXXXX",
+            "reason": "motionRecord",
+            "deviceId": device_id,
+            "createdBy": device_id,
+            "createdDate": "201609%02d" % (1 + i % 30),
+            "timeZone": "America/Chicago",
+            "ownerId": "336-4764296",
+            "utcCreatedDate": utc_created_date,
+            "currentState": "new",
+            "mediaDuration": "00:00:30",
+            "uniqueId": "336-4764296_"+device_id
+        })
+    # Round trip through json so that every string is its own object, the same as what requests hands back.
+    return json.dumps(recordings)
+
+def measure(build, payload):
+    gc.collect()
+    tracemalloc.start()
+    result = build(payload)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    payload = library_json(count)
+
+    dicts, dict_bytes = measure(json.loads, payload)
+    del dicts
+    records, record_bytes = measure(lambda p: Recording.FromList(json.loads(p)), payload)
+
+    print('%-10s %12s %16s' % ('type', 'MiB', 'MiB per 100k'))
+    for name, size in (('dict', dict_bytes), ('Recording', record_bytes)):
+        print('%-10s %12.1f %16.1f' % (name, size / 1048576.0, size / 1048576.0 * 100000 / count))
@@ -4,7 +4,7 @@ from setuptools import setup
 
 setup(
     name='pyarlo',
-    packages=['pyarlo'],
+    py_modules=['Arlo', 'ArloCli'],
     version='0.8.0',
     description='Python Arlo is a library written in Python 2.7/3x ' +
                 'which exposes the Netgear Arlo cameras via the apis that are consumed by their website.',
@@ -13,7 +13,12 @@ setup(
     url='https://github.com/jeffreydwalter/arlo',
     license=license,
     include_package_data=True,
-    install_requires=['requests', 'sseclient', 'json'],
+    install_requires=['requests', 'sseclient', 'monotonic'],
+    entry_points={
+        'console_scripts': [
+            'arlo=ArloCli:main',
+        ],
+    },
     test_suite='tests',
     keywords=[
         'arlo',
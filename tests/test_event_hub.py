@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import socket
+import threading
+import time
+import unittest
+
+from .context import Arlo
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+##
+# Accepts one connection, answers it with a chunked event-stream response and then sends whatever is passed to Send().
+##
+class EventServer(object):
+    def __init__(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.url = 'http://127.0.0.1:%d/subscribe' % self.listener.getsockname()[1]
+        self.sock = None
+        self.request = b''
+        self.connected = threading.Event()
+        self.eof = threading.Event()
+        self.thread = threading.Thread(target=self.Serve)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def Serve(self):
+        self.sock, address = self.listener.accept()
+        while b'\r\n\r\n' not in self.request:
+            self.request += self.sock.recv(4096)
+        self.sock.sendall(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n')
+        self.connected.set()
+        while self.sock.recv(4096):
+            pass
+        self.eof.set()
+
+    def Send(self, text):
+        data = text.encode('utf-8')
+        self.sock.sendall(('%x\r\n' % len(data)).encode('ascii') + data + b'\r\n')
+
+    def Close(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.listener.close()
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+class EventConnectionTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = Arlo.EventConnection('http://example.com/subscribe', {}, None, None)
+        self.sock, self.peer = socket.socketpair()
+        self.sock.setblocking(False)
+        self.connection.sock = self.sock
+
+    def tearDown(self):
+        self.sock.close()
+        self.peer.close()
+
+    def read(self, data):
+        self.peer.sendall(data)
+        time.sleep(0.01)
+        return self.connection.Read()
+
+    def test_plain_stream(self):
+        self.assertEqual(self.read(b'data: {"a":1}\n\ndata: {"b"'), ['{"a":1}'])
+        self.assertEqual(self.read(b':2}\r\n\r\nevent: x\nid: 1\n\n'), ['{"b":2}'])
+        self.assertFalse(self.connection.closed)
+
+    def test_multi_line_data(self):
+        self.assertEqual(self.read(b'data: {"a":\ndata:1}\n\n'), ['{"a":\n1}'])
+
+    def test_chunked_stream(self):
+        self.connection.chunked = True
+        body = b'data: {"resource":"modes"}\n\ndata: {"action":"is"}\n\n'
+
+        self.assertEqual(self.read(b'%x\r\n%s\r\n' % (10, body[:10])), [])
+        self.assertEqual(self.read(b'%x;ext=1\r\n%s' % (len(body) - 10, body[10:20])), [])
+        self.assertEqual(self.read(body[20:] + b'\r\n'), ['{"resource":"modes"}', '{"action":"is"}'])
+        self.assertFalse(self.connection.closed)
+
+        self.assertEqual(self.read(b'0\r\n\r\n'), [])
+        self.assertTrue(self.connection.closed)
+
+    def test_chunk_size_split_across_reads(self):
+        self.connection.chunked = True
+        body = b'data: {}\n\n'
+        self.assertEqual(self.read(b'%x' % len(body)), [])
+        self.assertEqual(self.read(b'\r\n' + body + b'\r'), [])
+        self.assertEqual(self.read(b'\n'), ['{}'])
+
+    def test_unicode(self):
+        self.assertEqual(self.read(u'data: {"name":"caf\u00e9"}\n\n'.encode('utf-8')), [u'{"name":"caf\u00e9"}'])
+
+    def test_server_closing_the_socket(self):
+        self.peer.shutdown(socket.SHUT_WR)
+        time.sleep(0.01)
+        self.assertEqual(self.connection.Read(), [])
+        self.assertTrue(self.connection.closed)
+
+class EventHubTest(unittest.TestCase):
+    def setUp(self):
+        self.server = EventServer()
+        self.hub = Arlo.EventHub()
+        self.events = []
+        self.closed = []
+
+    def tearDown(self):
+        self.hub.Stop()
+        self.server.Close()
+
+    def open(self):
+        connection = self.hub.Open(self.server.url, {'Cookie':'a=b'}, self.events.append, lambda: self.closed.append(True))
+        self.assertTrue(self.server.connected.wait(5))
+        return connection
+
+    def test_reads_events(self):
+        self.open()
+        self.server.Send('data: {"status":"connected"}\n\n')
+        self.server.Send('data: {"resource":')
+        self.server.Send('"modes"}\n\ndata: {"action":"is"}\n\n')
+
+        self.assertTrue(wait_for(lambda: len(self.events) == 3))
+        self.assertEqual(self.events, ['{"status":"connected"}', '{"resource":"modes"}', '{"action":"is"}'])
+        self.assertIn(b'Cookie: a=b\r\n', self.server.request)
+
+    def test_callback_errors_are_logged_and_dont_close_the_stream(self):
+        handler = RecordingHandler()
+        Arlo.log.addHandler(handler)
+        self.addCleanup(Arlo.log.removeHandler, handler)
+
+        def on_event(data):
+            if data == 'bad':
+                raise ValueError('bad event')
+            self.events.append(data)
+        self.hub.Open(self.server.url, {}, on_event, lambda: self.closed.append(True))
+        self.assertTrue(self.server.connected.wait(5))
+        self.server.Send('data: bad\n\ndata: good\n\n')
+
+        self.assertTrue(wait_for(lambda: self.events == ['good']))
+        self.assertEqual(self.closed, [])
+        self.assertEqual(len(handler.records), 1)
+        self.assertEqual(handler.records[0].exc_info[0], ValueError)
+
+    def test_remove_closes_the_connection(self):
+        connection = self.open()
+        self.assertTrue(wait_for(lambda: self.hub.Count() == 1))
+
+        connection.Stop()
+
+        self.assertTrue(self.server.eof.wait(5))
+        self.assertTrue(wait_for(lambda: self.hub.Count() == 0))
+        self.assertTrue(connection.closed)
+        self.assertEqual(self.closed, [])
+
+    def test_event_stream_disconnect_closes_the_connection(self):
+        event_stream = Arlo.EventStream(None, None)
+        event_stream.connection = self.open()
+        event_stream.Connect()
+
+        event_stream.Disconnect()
+
+        self.assertTrue(self.server.eof.wait(5))
+        self.assertTrue(wait_for(lambda: self.hub.Count() == 0))
+        self.assertIsNone(event_stream.connection)
+
+    def test_server_closing_the_stream_calls_on_close(self):
+        self.open()
+        self.server.sock.shutdown(socket.SHUT_RDWR)
+
+        self.assertTrue(wait_for(lambda: self.closed == [True]))
+        self.assertEqual(self.hub.Count(), 0)
+
+class FakeArlo(object):
+    def __init__(self, executor=None):
+        self.username = 'user@example.com'
+        self.executor = executor
+
+def event(resource, transId='BASESTATION1!1'):
+    return Arlo.StreamEvent('{"resource":"%s","transId":"%s","properties":{}}' % (resource, transId))
+
+class EventHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.basestation = {'deviceId':'BASESTATION1'}
+        self.received = []
+        self.executor = None
+
+    def tearDown(self):
+        if self.executor is not None:
+            self.executor.Shutdown()
+
+    def callback(self, arlo, basestation, event):
+        self.received.append(event['resource'])
+
+    def test_filters_by_resource(self):
+        handler = Arlo.EventHandler(FakeArlo(), self.basestation, self.callback, resources=['cameras/'])
+
+        handler.Push(event('cameras/CAMERA1'))
+        handler.Push(event('modes'))
+        handler.Push(event('modes', transId=Arlo.Arlo.TRANSID_PREFIX+'!1'))
+
+        self.assertEqual(self.received, ['cameras/CAMERA1', 'modes'])
+
+    def test_callback_errors_dont_stop_the_handler(self):
+        def callback(arlo, basestation, event):
+            if event['resource'] == 'bad':
+                raise ValueError('bad event')
+            self.callback(arlo, basestation, event)
+        handler = Arlo.EventHandler(FakeArlo(), self.basestation, callback)
+        logging.getLogger('Arlo').disabled = True
+        self.addCleanup(setattr, logging.getLogger('Arlo'), 'disabled', False)
+
+        handler.Push(event('bad'))
+        handler.Push(event('good'))
+
+        self.assertEqual(self.received, ['good'])
+
+    def test_runs_one_event_per_job_on_the_executor(self):
+        self.executor = Arlo.FairExecutor(1)
+        handler = Arlo.EventHandler(FakeArlo(self.executor), self.basestation, self.callback)
+        started = threading.Event()
+        release = threading.Event()
+        def block():
+            started.set()
+            release.wait(5)
+        self.executor.Submit('blocker', block)
+        self.assertTrue(started.wait(5))
+
+        for i in range(3):
+            handler.Push(event('event'+str(i)))
+        for i in range(2):
+            self.executor.Submit('other@example.com', self.received.append, 'other'+str(i))
+        release.set()
+
+        self.assertTrue(wait_for(lambda: len(self.received) == 5))
+        self.assertEqual(self.received, ['event0', 'other0', 'event1', 'other1', 'event2'])
+
+    def test_keeps_events_in_order(self):
+        self.executor = Arlo.FairExecutor(4)
+        handler = Arlo.EventHandler(FakeArlo(self.executor), self.basestation, self.callback)
+
+        for i in range(100):
+            handler.Push(event(str(i)))
+
+        self.assertTrue(wait_for(lambda: len(self.received) == 100))
+        self.assertEqual(self.received, [ str(i) for i in range(100) ])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+from .context import Arlo
+
+class FairExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = None
+
+    def tearDown(self):
+        if self.executor is not None:
+            self.executor.Shutdown()
+
+    # Keeps the executor's only worker busy until the returned event is set, so jobs can be queued up behind it.
+    def block(self):
+        started = threading.Event()
+        release = threading.Event()
+        def wait():
+            started.set()
+            release.wait(5)
+        self.executor.Submit('blocker', wait)
+        self.assertTrue(started.wait(5))
+        return release
+
+    def test_keys_are_served_round_robin(self):
+        self.executor = Arlo.FairExecutor(1)
+        order = []
+        release = self.block()
+
+        jobs = [ self.executor.Submit(key, order.append, key+str(i)) for key, count in (('a', 3), ('b', 2), ('c', 1)) for i in range(count) ]
+        release.set()
+        for job in jobs:
+            job.Result(5)
+
+        self.assertEqual(order, ['a0', 'b0', 'c0', 'a1', 'b1', 'a2'])
+
+    def test_results_and_errors(self):
+        self.executor = Arlo.FairExecutor(2)
+
+        def fail():
+            raise ValueError('failed')
+
+        self.assertEqual(self.executor.Submit('a', lambda x: x * 2, 21).Result(5), 42)
+        self.assertRaises(ValueError, self.executor.Submit('a', fail).Result, 5)
+
+    def test_rate_limit_only_slows_down_its_own_key(self):
+        self.executor = Arlo.FairExecutor(2)
+        self.executor.SetRateLimit('slow', 10)
+        times = {'slow':[], 'fast':[]}
+        started = time.time()
+
+        jobs = [ self.executor.Submit(key, lambda key=key: times[key].append(time.time() - started)) for i in range(4) for key in ('slow', 'fast') ]
+        for job in jobs:
+            job.Result(5)
+
+        # 1 call right away, then one every 100ms.
+        gaps = [ b - a for a, b in zip(times['slow'], times['slow'][1:]) ]
+        self.assertEqual(len(gaps), 3)
+        for gap in gaps:
+            self.assertGreater(gap, 0.08)
+        self.assertLess(max(times['fast']), 0.1)
+
+    def test_default_rate_applies_to_every_key(self):
+        self.executor = Arlo.FairExecutor(2, rate=20, burst=2)
+        times = []
+        started = time.time()
+
+        jobs = [ self.executor.Submit('a', lambda: times.append(time.time() - started)) for i in range(4) ]
+        for job in jobs:
+            job.Result(5)
+
+        # The burst of 2 goes right away, the other two wait 50ms each.
+        self.assertLess(times[1], 0.04)
+        self.assertGreater(times[3], 0.08)
+
+    def test_claimed_jobs_are_not_run_twice(self):
+        self.executor = Arlo.FairExecutor(1)
+        calls = []
+        release = self.block()
+
+        job = self.executor.Submit('a', calls.append, 1)
+        self.assertTrue(job.Claim())
+        job.Run()
+        release.set()
+        self.executor.Submit('a', calls.append, 2).Result(5)
+
+        self.assertEqual(calls, [1, 2])
+
+    def test_submit_after_shutdown_fails(self):
+        executor = Arlo.FairExecutor(1)
+        executor.Shutdown()
+        self.assertRaises(Exception, executor.Submit, 'a', lambda: None)
+
+class RateLimiterTest(unittest.TestCase):
+    def test_allows_bursts_then_waits(self):
+        limiter = Arlo.RateLimiter(10, burst=2)
+        for i in range(2):
+            self.assertEqual(limiter.Delay(), 0)
+            limiter.Take()
+        delay = limiter.Delay()
+        self.assertGreater(delay, 0.09)
+        self.assertLessEqual(delay, 0.1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+from .context import Arlo
+from .test_requests import fake_client
+
+RECORDING = {
+    'name':'1472881430181',
+    'uniqueId':'XXX-XXXXXXX_CAMERA1',
+    'deviceId':'CAMERA1',
+    'ownerId':'XXX-XXXXXXX',
+    'createdDate':'20160903',
+    'utcCreatedDate':1472881430181,
+    'timeZone':'America/Chicago',
+    'contentType':'video/mp4',
+    'reason':'motionRecord',
+    'mediaDuration':'00:00:30',
+    'mediaDurationSecond':30,
+    'presignedContentUrl':'https://example.com/recording.mp4'
+}
+
+def copy_strings(data):
+    # json.loads() gives every record its own copy of each string, like the library does.
+    return json.loads(json.dumps(data))
+
+class RecordTest(unittest.TestCase):
+    def test_round_trip(self):
+        recording = Arlo.Recording(RECORDING)
+
+        self.assertEqual(recording.ToDict(), RECORDING)
+        self.assertEqual(dict(recording), RECORDING)
+        self.assertEqual(recording, RECORDING)
+        self.assertEqual(len(recording), len(RECORDING))
+        self.assertEqual(sorted(recording.keys()), sorted(RECORDING))
+        self.assertEqual(sorted(recording.items()), sorted(RECORDING.items()))
+
+    def test_dict_access(self):
+        recording = Arlo.Recording(RECORDING)
+
+        self.assertEqual(recording['deviceId'], 'CAMERA1')
+        self.assertEqual(recording.get('deviceId'), 'CAMERA1')
+        self.assertIsNone(recording.get('presignedThumbnailUrl'))
+        self.assertEqual(recording.get('nope', 'default'), 'default')
+        self.assertRaises(KeyError, lambda: recording['presignedThumbnailUrl'])
+        self.assertIn('deviceId', recording)
+        self.assertNotIn('presignedThumbnailUrl', recording)
+        self.assertTrue(isinstance(recording, Arlo.Mapping))
+
+    def test_extra_keys(self):
+        data = dict(RECORDING, newField={'a':1}, other=None)
+        recording = Arlo.Recording(data)
+
+        self.assertEqual(recording.extra, {'newField':{'a':1}, 'other':None})
+        self.assertEqual(recording['newField'], {'a':1})
+        self.assertIn('other', recording)
+        self.assertEqual(recording.ToDict(), data)
+        self.assertEqual(len(recording), len(data))
+
+    def test_records_are_compact(self):
+        recording = Arlo.Recording(RECORDING)
+        device = Arlo.Device({'deviceId':'CAMERA1', 'deviceType':'camera'})
+
+        self.assertFalse(hasattr(recording, '__dict__'))
+        self.assertFalse(hasattr(device, '__dict__'))
+        self.assertRaises(AttributeError, setattr, recording, 'unknown', 1)
+
+    def test_repeated_strings_are_shared(self):
+        first = Arlo.Recording(copy_strings(RECORDING))
+        second = Arlo.Recording(copy_strings(RECORDING))
+
+        self.assertIsNot(copy_strings(RECORDING)['timeZone'], copy_strings(RECORDING)['timeZone'])
+        for key in ('deviceId', 'timeZone', 'ownerId', 'contentType'):
+            self.assertIs(first[key], second[key])
+        # Unique values aren't interned.
+        self.assertIsNot(first['presignedContentUrl'], second['presignedContentUrl'])
+
+    def test_json(self):
+        recording = Arlo.Recording(RECORDING)
+        self.assertEqual(json.loads(json.dumps([recording], default=dict)), [RECORDING])
+
+    def test_batch_delete_recordings_converts_records(self):
+        arlo = fake_client('A')
+        recording = Arlo.Recording(RECORDING)
+        plain = {'createdDate':'20160904', 'utcCreatedDate':1473010280395, 'deviceId':'CAMERA2'}
+
+        arlo.BatchDeleteRecordings([recording, plain])
+
+        self.assertEqual(arlo.session.requests[0][1], 'https://arlo.netgear.com/hmsweb/users/library/recycle')
+        self.assertEqual(arlo.session.bodies[0], {'data':[
+            {'createdDate':'20160903', 'utcCreatedDate':1472881430181, 'deviceId':'CAMERA1'},
+            plain
+        ]})
+
+if __name__ == '__main__':
+    unittest.main()
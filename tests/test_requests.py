@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from .context import Arlo
+
+class FakeResponse(object):
+    cookies = {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'success':True, 'data':{}}
+
+class FakeSession(object):
+    def __init__(self):
+        self.requests = []
+        self.bodies = []
+
+    def request(self, method, url, headers=None, cookies=None, **kwargs):
+        self.requests.append((method, url, headers, cookies))
+        self.bodies.append(kwargs.get('json'))
+        return FakeResponse()
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+def fake_client(name):
+    # Skip __init__, it logs in.
+    arlo = Arlo.Arlo.__new__(Arlo.Arlo)
+    arlo.session = FakeSession()
+    arlo.headers = {'Authorization':'token-'+name, 'X-Only-'+name:'1'}
+    arlo.cookies = {'only'+name:'1'}
+    arlo.user_id = 'USER-'+name
+    arlo.notify_templates = {}
+    return arlo
+
+class RequestTest(unittest.TestCase):
+    def test_clients_dont_share_headers_or_cookies(self):
+        a = fake_client('A')
+        b = fake_client('B')
+
+        b.get('https://example.com/b', 'B')
+        b.post('https://example.com/b', {}, 'B')
+        b.put('https://example.com/b', {}, 'B')
+        a.get('https://example.com/a', 'A')
+
+        method, url, headers, cookies = a.session.requests[-1]
+        self.assertEqual(headers, {'Authorization':'token-A', 'X-Only-A':'1'})
+        self.assertEqual(cookies, {'onlyA':'1'})
+        self.assertEqual(a.headers, {'Authorization':'token-A', 'X-Only-A':'1'})
+
+    def test_extra_headers_are_per_request(self):
+        a = fake_client('A')
+        extra = {'xcloudId':'XCLOUD1'}
+
+        a.post('https://example.com/a', {}, 'A', headers=extra)
+        a.post('https://example.com/a', {}, 'A')
+
+        self.assertEqual(a.session.requests[0][2]['xcloudId'], 'XCLOUD1')
+        self.assertNotIn('xcloudId', a.session.requests[1][2])
+        self.assertEqual(extra, {'xcloudId':'XCLOUD1'})
+        self.assertNotIn('xcloudId', a.headers)
+
+    def test_notify_leaves_its_template_alone(self):
+        a = fake_client('A')
+        basestation = {'deviceId':'BASESTATION1', 'xCloudId':'XCLOUD1'}
+
+        a.Notify(basestation, {'action':'get', 'resource':'modes'})
+        a.cookies = {'later':'1'}
+        a.Notify(basestation, {'action':'get', 'resource':'modes'})
+
+        url, headers, envelope = a.NotifyTemplate(basestation)
+        self.assertEqual(headers, {'Authorization':'token-A', 'X-Only-A':'1', 'xcloudId':'XCLOUD1'})
+        self.assertEqual(a.session.requests[1][3], {'later':'1'})
+
+if __name__ == '__main__':
+    unittest.main()
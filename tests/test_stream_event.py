@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+from .context import Arlo
+
+class StreamEventTest(unittest.TestCase):
+    def assertRouting(self, raw, **expected):
+        event = Arlo.StreamEvent(raw)
+        for key in Arlo.StreamEvent.ROUTING_FIELDS:
+            self.assertEqual(event.get(key), expected.get(key), key)
+        self.assertEqual(event.body, json.loads(raw))
+
+    def test_routing_fields_are_read_without_decoding(self):
+        event = Arlo.StreamEvent('{"resource":"cameras/CAMERA1","properties":{"motionDetected":true},"from":"BASESTATION1","transId":"web!1","action":"is"}')
+
+        self.assertEqual(event.get('resource'), 'cameras/CAMERA1')
+        self.assertEqual(event.get('from'), 'BASESTATION1')
+        self.assertEqual(event.get('transId'), 'web!1')
+        self.assertEqual(event.get('action'), 'is')
+        self.assertEqual(event.get('status', 'none'), 'none')
+        self.assertIsNone(event._body)
+
+        self.assertEqual(event['properties'], {'motionDetected':True})
+
+    def test_nested_keys_are_not_routing_fields(self):
+        self.assertRouting('{"resource":"cameras/CAMERA1","properties":{"from":"nested","transId":"web!x","action":"nested"}}',
+                           resource='cameras/CAMERA1')
+        self.assertRouting('{"properties":[{"resource":"nested"},{"action":"nested"}],"action":"is","from":"BASESTATION1"}',
+                           action='is', **{'from':'BASESTATION1'})
+
+    def test_escaped_quotes(self):
+        self.assertRouting(r'{"properties":{"note":"say \"hi\", \"from\":\"nested\""},"from":"a \"quoted\" name","action":"is\\"}',
+                           action='is\\', **{'from':'a "quoted" name'})
+
+    def test_brackets_inside_strings(self):
+        self.assertRouting('{"properties":{"note":"}}]","from":"nested"},"resource":"{modes}","transId":"web!{1}"}',
+                           resource='{modes}', transId='web!{1}')
+        self.assertRouting('{"note":"{{[","properties":{"action":"nested"},"action":"is"}', action='is')
+
+    def test_values_that_are_not_strings_are_decoded(self):
+        event = Arlo.StreamEvent('{"resource":"cameras/CAMERA1","status":200,"properties":{}}')
+        self.assertEqual(event.get('resource'), 'cameras/CAMERA1')
+        self.assertIsNone(event._body)
+        self.assertEqual(event.get('status'), 200)
+        self.assertIsNotNone(event._body)
+
+        self.assertRouting('{"action":null,"status":{"code":1},"transId":["web!1"]}', status={'code':1}, transId=['web!1'])
+
+    def test_whitespace_and_unicode(self):
+        self.assertRouting(u'{\n "resource" : "cameras/CAMERA1",\n "properties" : {"name" : "caf\\u00e9"},\n "from" :\t"café"\n}',
+                           resource='cameras/CAMERA1', **{'from':u'café'})
+
+if __name__ == '__main__':
+    unittest.main()
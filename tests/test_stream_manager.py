@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+from .context import Arlo
+
+class FakeArlo(object):
+    def __init__(self):
+        self.started = []
+        self.stopped = []
+
+    def StartStream(self, camera):
+        self.started.append(camera.get('deviceId'))
+        return {'url':'rtmps://example.com/'+camera.get('deviceId')+'/'+str(len(self.started))}
+
+    def StopStream(self, camera):
+        self.stopped.append(camera.get('deviceId'))
+
+##
+# StopStream() blocks until release is set, and every call is logged in calls in the order it finished.
+##
+class SlowStopArlo(FakeArlo):
+    def __init__(self):
+        FakeArlo.__init__(self)
+        self.calls = []
+        self.stopping = threading.Event()
+        self.release = threading.Event()
+
+    def StartStream(self, camera):
+        self.calls.append('start')
+        return FakeArlo.StartStream(self, camera)
+
+    def StopStream(self, camera):
+        self.stopping.set()
+        self.release.wait(5)
+        self.calls.append('stop')
+        FakeArlo.StopStream(self, camera)
+
+class StreamManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.arlo = FakeArlo()
+        self.streams = Arlo.StreamManager(self.arlo, ttl=300, idle_timeout=30, reaper=False)
+        self.camera = {'deviceId':'CAMERA1', 'parentId':'BASESTATION1', 'xCloudId':'XCLOUD1'}
+
+    def test_reuses_active_stream(self):
+        first = self.streams.Acquire(self.camera)
+        second = self.streams.Acquire(self.camera)
+
+        self.assertIs(first, second)
+        self.assertEqual(first.refs, 2)
+        self.assertEqual(self.arlo.started, ['CAMERA1'])
+        stats = self.streams.Stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hitRate']), (1, 1, 0.5))
+        self.assertIsNotNone(stats['startLatencyAvg'])
+
+    def test_starts_new_stream_after_expiry(self):
+        first = self.streams.Acquire(self.camera)
+        first.expires = 0
+        second = self.streams.Acquire(self.camera)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(self.arlo.started, ['CAMERA1', 'CAMERA1'])
+
+        # Releasing the old session must not touch the new one, or stop the camera's newer stream.
+        self.streams.Release(first)
+        self.assertEqual(second.refs, 1)
+        self.assertEqual(self.arlo.stopped, [])
+
+        self.streams.Release(second)
+        self.streams.idle_timeout = 0
+        self.assertFalse(self.streams.Reap())
+        self.assertEqual(self.arlo.stopped, ['CAMERA1'])
+
+    def test_expired_session_is_stopped_when_last_consumer_releases_it(self):
+        session = self.streams.Acquire(self.camera)
+        session.expires = 0
+
+        self.assertTrue(self.streams.Reap())
+        self.assertEqual(self.arlo.stopped, [])
+
+        self.streams.Release(session)
+        self.assertEqual(self.arlo.stopped, ['CAMERA1'])
+        self.assertEqual(self.streams.Stats()['active'], 0)
+
+    def test_reap_only_stops_idle_streams(self):
+        session = self.streams.Acquire(self.camera)
+        self.streams.Release(session)
+
+        self.assertTrue(self.streams.Reap())
+        self.assertEqual(self.arlo.stopped, [])
+
+        self.streams.idle_timeout = 0
+        self.assertFalse(self.streams.Reap())
+        self.assertEqual(self.arlo.stopped, ['CAMERA1'])
+
+    def test_reap_keeps_streams_in_use(self):
+        self.streams.Acquire(self.camera)
+        self.streams.idle_timeout = 0
+
+        self.assertTrue(self.streams.Reap())
+        self.assertEqual(self.arlo.stopped, [])
+
+    def test_invalidated_stream_is_not_reused(self):
+        first = self.streams.Acquire(self.camera)
+        self.streams.Invalidate(first)
+        self.streams.Release(first)
+        self.assertEqual(self.arlo.stopped, ['CAMERA1'])
+
+        second = self.streams.Acquire(self.camera)
+        self.assertIsNot(first, second)
+        self.assertEqual(len(self.arlo.started), 2)
+
+    def test_stop_all_stops_streams_in_use(self):
+        session = self.streams.Acquire(self.camera)
+        self.streams.StopAll()
+
+        self.assertEqual(self.arlo.stopped, ['CAMERA1'])
+        self.assertEqual(self.streams.Stats()['active'], 0)
+        self.assertIsNot(self.streams.Acquire(self.camera), session)
+
+    def test_acquire_waits_for_the_old_stream_to_stop(self):
+        self.arlo = SlowStopArlo()
+        self.streams.arlo = self.arlo
+        first = self.streams.Acquire(self.camera)
+        first.expires = 0
+        self.streams.Reap()
+
+        releasing = threading.Thread(target=self.streams.Release, args=(first,))
+        releasing.start()
+        self.assertTrue(self.arlo.stopping.wait(5))
+
+        acquired = []
+        acquiring = threading.Thread(target=lambda: acquired.append(self.streams.Acquire(self.camera)))
+        acquiring.start()
+        time.sleep(0.1)
+        # Still waiting for the camera to go idle.
+        self.assertEqual(acquired, [])
+
+        self.arlo.release.set()
+        releasing.join(5)
+        acquiring.join(5)
+        self.assertEqual(self.arlo.calls, ['start', 'stop', 'start'])
+        self.assertIsNot(acquired[0], first)
+        self.assertTrue(acquired[0].current)
+
+    def test_stop_skips_cameras_that_are_in_use_again(self):
+        first = self.streams.Acquire(self.camera)
+        self.streams.Invalidate(first)
+        # A new stream is started after Release() decided to stop the old one, but before it got to.
+        second = self.streams.Acquire(self.camera)
+        self.streams.Stop(first)
+
+        self.assertEqual(self.arlo.stopped, [])
+        self.assertIs(self.streams.Acquire(self.camera), second)
+
+if __name__ == '__main__':
+    unittest.main()